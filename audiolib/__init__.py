@@ -0,0 +1,5 @@
+"""Shared audio helpers used by the tools in this portfolio.
+
+The tools are run as scripts from their own directories, so each one puts
+the repository root on sys.path before importing from here.
+"""
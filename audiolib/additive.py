@@ -0,0 +1,125 @@
+"""Additive synthesis from harmonic spectra, static or evolving.
+
+A Timbre is a list of partial amplitudes (harmonic 1 first), optionally
+with a gain envelope per partial given as (seconds, level) breakpoints.
+
+Static timbres (no envelopes) are rendered from one single-cycle table
+built by inverse FFT (see wavetable), so the cost per sample is the same
+for 3 partials or 300. Evolving timbres go through a PartialBank, which
+makes every partial from one sin and one cos per sample with the
+Chebyshev recurrence
+
+    sin((k + 1)x) = 2 cos(x) sin(kx) - sin((k - 1)x)
+
+so each extra partial costs a few multiply-adds rather than another
+full-length np.sin. Both render block by block, carrying their phase.
+"""
+
+import numpy as np
+
+from audiolib import wavetable
+
+
+def nyquist_partials(frequency, sample_rate, count):
+    """Returns how many of the first count harmonics of frequency lie below Nyquist."""
+    if frequency <= 0:
+        return count
+    return max(1, min(count, int(sample_rate / 2 / frequency)))
+
+
+class PartialBank:
+    """Renders harmonic partials with per-partial gain envelopes by recurrence.
+
+    envelopes maps a partial number (1 is the fundamental) to (seconds,
+    level) breakpoints; the level is linearly interpolated between them and
+    held past either end. Partials without one keep their plain amplitude.
+    Partials above Nyquist are dropped. Output is float32.
+    """
+
+    def __init__(self, amplitudes, envelopes, frequency, sample_rate, phase=0.0):
+        count = nyquist_partials(frequency, sample_rate, len(amplitudes))
+        self.amplitudes = np.asarray(amplitudes[:count], dtype=np.float64)
+        self.envelopes = {}
+        for k, points in envelopes.items():
+            if 1 <= k <= count:
+                times, levels = zip(*points)
+                self.envelopes[k] = (np.asarray(times, dtype=np.float64) * sample_rate,
+                                     np.asarray(levels, dtype=np.float64))
+        self.increment = 2 * np.pi * frequency / sample_rate
+        # `phase` is given in cycles.
+        self.phase = 2 * np.pi * phase
+        self.position = 0
+
+    def render(self, n, out=None):
+        """Renders the next n samples, into out if given."""
+        x = np.arange(n, dtype=np.float64)
+        positions = x + self.position
+        x *= self.increment
+        x += self.phase
+        self.phase = (self.phase + n * self.increment) % (2 * np.pi)
+        self.position += n
+
+        previous = np.zeros(n)
+        current = np.sin(x)
+        two_cos = np.cos(x)
+        two_cos *= 2
+        total = np.zeros(n)
+        term = np.empty(n)
+        for k, amplitude in enumerate(self.amplitudes, start=1):
+            if k in self.envelopes:
+                times, levels = self.envelopes[k]
+                np.multiply(current, np.interp(positions, times, levels), out=term)
+                term *= amplitude
+                total += term
+            elif amplitude:
+                total += amplitude * current
+            # previous, current = current, 2 cos(x) current - previous
+            np.multiply(two_cos, current, out=term)
+            term -= previous
+            previous, current, term = current, term, previous
+
+        if out is None:
+            return total.astype(np.float32)
+        out[:] = total
+        return out
+
+    def blocks(self, block_size, n_samples=None, out=None):
+        """Yields the next n_samples (forever if None) as float32 blocks of block_size."""
+        remaining = n_samples
+        while remaining is None or remaining > 0:
+            n = block_size if remaining is None else min(block_size, remaining)
+            yield self.render(n, None if out is None else out[:n])
+            if remaining is not None:
+                remaining -= n
+
+
+class Timbre:
+    """A harmonic spectrum, with optional per-partial gain envelopes.
+
+    amplitudes[0] is the fundamental. envelopes maps partial numbers
+    (1-based) to (seconds, level) breakpoints that scale that partial's
+    amplitude over the note.
+    """
+
+    def __init__(self, amplitudes, envelopes=None):
+        self.amplitudes = tuple(float(a) for a in amplitudes)
+        self.envelopes = {int(k): tuple(points) for k, points in (envelopes or {}).items()}
+
+    @property
+    def static(self):
+        """True when the spectrum does not change over the note."""
+        return not self.envelopes
+
+    def oscillator(self, frequency, sample_rate, phase=0.0):
+        """Returns a table Oscillator for a static timbre, or a PartialBank for an evolving one."""
+        if self.static:
+            return wavetable.stack_oscillator(self.amplitudes, frequency, sample_rate, phase)
+        return PartialBank(self.amplitudes, self.envelopes, frequency, sample_rate, phase)
+
+    def blocks(self, frequency, sample_rate, block_size=4096, n_samples=None):
+        """Yields n_samples (forever if None) of the timbre at frequency as float32 blocks."""
+        return self.oscillator(frequency, sample_rate).blocks(block_size, n_samples)
+
+    def render(self, frequency, n_samples, sample_rate):
+        """Renders n_samples of the timbre at frequency."""
+        return self.oscillator(frequency, sample_rate).render(n_samples)
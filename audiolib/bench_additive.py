@@ -0,0 +1,63 @@
+"""Benchmark: additive synthesis by table, by recurrence bank and by one np.sin per partial.
+
+    python audiolib/bench_additive.py [--sample-rate 44100] [--seconds 2] [--repeat 5]
+
+Renders a 1/k spectrum at 110 Hz with a growing number of partials three
+ways: a full-length np.sin per partial (what trumpet.py used to do), the
+cached inverse-FFT table of a static Timbre, and the PartialBank that an
+evolving Timbre uses.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from audiolib import additive
+
+
+def best_time(f, repeat):
+    """Returns the best-of-`repeat` wall time of f() in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def naive(amplitudes, frequency, n_samples, sample_rate):
+    t = np.linspace(0, n_samples / sample_rate, n_samples, False)
+    wave = np.zeros(n_samples)
+    for k, amplitude in enumerate(amplitudes, start=1):
+        wave += amplitude * np.sin(2 * np.pi * frequency * k * t)
+    return wave
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare additive synthesis engines by partial count.")
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sr, frequency = args.sample_rate, 110.0
+    n = int(args.seconds * sr)
+    print(f"{'partials':>8} {'np.sin':>10} {'table':>10} {'bank':>10}")
+    for count in (3, 8, 32, 128):
+        amplitudes = [1 / k for k in range(1, count + 1)]
+        static = additive.Timbre(amplitudes)
+        evolving = additive.Timbre(amplitudes, {k: [(0.0, 0.0), (0.5, 1.0)] for k in range(1, count + 1)})
+        times = [
+            best_time(lambda: naive(amplitudes, frequency, n, sr), args.repeat),
+            best_time(lambda: static.render(frequency, n, sr), args.repeat),
+            best_time(lambda: evolving.render(frequency, n, sr), args.repeat),
+        ]
+        print(f"{count:>8} " + " ".join(f"{t * 1e3:>8.2f}ms" for t in times))
+
+
+if __name__ == "__main__":
+    main()
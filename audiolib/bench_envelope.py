@@ -0,0 +1,75 @@
+"""Benchmark: cached in-place envelopes against full-length np.ones + linspace builds.
+
+    python audiolib/bench_envelope.py [--sample-rate 44100] [--repeat 20]
+
+Times the trumpet's ADSR and popgen's 10% fade over notes of growing
+length, the old way (build a whole gain array, multiply the note by it)
+and with audiolib.envelope.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from audiolib import envelope
+
+
+def best_time(f, repeat):
+    """Returns the best-of-`repeat` wall time of f() in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def old_adsr(wave, attack, decay, sustain_level, release):
+    n = len(wave)
+    env = np.ones_like(wave)
+    sustain = n - attack - decay - release
+    env[:attack] = np.linspace(0, 1, attack)
+    env[attack:attack + decay] = np.linspace(1, sustain_level, decay)
+    env[attack + decay:attack + decay + sustain] = sustain_level
+    env[-release:] = np.linspace(sustain_level, 0, release)
+    wave *= env
+    return wave
+
+
+def old_fade(wave):
+    n = len(wave)
+    attack = release = int(n * 0.1)
+    env = np.ones(n)
+    env[:attack] = np.linspace(0, 1, attack)
+    env[-release:] = np.linspace(1, 0, release)
+    return wave * env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cached in-place envelopes with full-length builds.")
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    sr = args.sample_rate
+    attack, decay, release = int(0.05 * sr), int(0.1 * sr), int(0.1 * sr)
+    print(f"{'note':>8} {'ADSR old':>10} {'ADSR new':>10} {'fade old':>10} {'fade new':>10}")
+    for seconds in (0.5, 1, 2, 5, 10):
+        n = int(seconds * sr)
+        note32 = np.ones(n, dtype=np.float32)
+        note64 = np.ones(n)
+        times = [
+            best_time(lambda: old_adsr(note32, attack, decay, 0.8, release), args.repeat),
+            best_time(lambda: envelope.adsr(n, attack, decay, 0.8, release).apply(note32), args.repeat),
+            best_time(lambda: old_fade(note64), args.repeat),
+            best_time(lambda: envelope.fade(n, int(n * 0.1), int(n * 0.1)).apply(note64), args.repeat),
+        ]
+        print(f"{seconds:>7}s " + " ".join(f"{t * 1e3:>8.3f}ms" for t in times))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Gain envelopes made of cached linear ramps, applied in place.
+
+An Envelope is a few linear ramps over sample ranges (attack, decay,
+release) with constant holds between them. Applying one only does real
+work over the ramps: each ramp multiplies its samples by a cached
+np.linspace table, and each hold is a single scalar multiply, skipped
+entirely when its level is 1. No full-length gain array is ever built,
+so the cost per note is the length of its ramps, not of the note.
+
+Any block of a note can be enveloped on its own, given the sample it
+starts at, so a note can be synthesized and shaped block by block. The
+ramps match np.linspace(begin, end, length) sample for sample.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=256)
+def _ramp_table(length, begin, end, dtype):
+    table = np.linspace(begin, end, length).astype(dtype)
+    table.flags.writeable = False
+    return table
+
+
+def ramp_table(length, begin, end, dtype=np.float32):
+    """Returns np.linspace(begin, end, length) as a cached, read-only array."""
+    return _ramp_table(int(length), float(begin), float(end), np.dtype(dtype).str)
+
+
+def fit(n_samples, *lengths):
+    """Shrinks segment lengths in proportion, if need be, so together they fit in n_samples."""
+    total = sum(lengths)
+    if total <= n_samples:
+        return lengths
+    scale = max(n_samples, 0) / total
+    return tuple(int(length * scale) for length in lengths)
+
+
+class Envelope:
+    """Gain curve made of linear ramps with holds between them.
+
+    The gain is 1 before the first ramp, and holds each ramp's last value
+    until the next ramp starts.
+    """
+
+    def __init__(self):
+        # (start, used, length, begin, end, last): the first `used`
+        # samples of a `length`-sample ramp, and the gain it leaves.
+        self.segments = []
+
+    def ramp(self, start, length, begin, end):
+        """Ramps from begin to end over samples [start, start + length).
+
+        A ramp overrides whatever earlier ramps set from start onwards.
+        Returns the envelope, so ramps can be chained.
+        """
+        if length <= 0:
+            return self
+        kept = []
+        for segment in self.segments:
+            s, used, full, b, e, _ = segment
+            if s >= start:
+                continue
+            if s + used > start:
+                used = start - s
+                segment = (s, used, full, b, e, float(ramp_table(full, b, e, np.float64)[used - 1]))
+            kept.append(segment)
+        last = end if length > 1 else begin
+        kept.append((start, length, length, begin, end, last))
+        self.segments = kept
+        return self
+
+    def apply(self, block, start=0):
+        """Multiplies a (frames,) or (frames, channels) block starting at sample start, in place."""
+        stop = start + len(block)
+        position = start  # first sample not enveloped yet
+        level = 1.0
+        for s, used, full, b, e, last in self.segments:
+            if s >= stop:
+                break
+            # The hold up to this ramp.
+            if position < s:
+                scale(block, position - start, s - start, level)
+                position = s
+            # The part of the ramp inside the block.
+            lo, hi = max(s, start), min(s + used, stop)
+            if lo < hi:
+                table = ramp_table(full, b, e, block.dtype)[lo - s:hi - s]
+                block[lo - start:hi - start] *= table if block.ndim == 1 else table[:, None]
+            position = max(position, s + used)
+            level = last
+        scale(block, position - start, len(block), level)
+        return block
+
+    def gain(self, start, n, dtype=np.float32):
+        """Returns the gains for samples [start, start + n)."""
+        return self.apply(np.ones(n, dtype=dtype), start)
+
+
+def scale(block, lo, hi, level):
+    """Multiplies block[lo:hi] by level in place, if there is anything to do."""
+    lo = max(lo, 0)
+    if lo < hi and level != 1:
+        block[lo:hi] *= level
+
+
+def fade(n_samples, attack, release):
+    """Linear fade in over attack samples and out over the last release samples.
+
+    Fades longer than the note are shortened in proportion to fit.
+    """
+    attack, release = fit(n_samples, attack, release)
+    return Envelope().ramp(0, attack, 0, 1).ramp(n_samples - release, release, 1, 0)
+
+
+def adsr(n_samples, attack, decay, sustain_level, release):
+    """Attack to 1, decay to sustain_level, hold, then release to 0 over the last release samples.
+
+    When attack, decay and release don't fit in the note, they are
+    shortened in proportion so the note still rises, falls and ends at 0,
+    with no sustain.
+    """
+    attack, decay, release = fit(n_samples, attack, decay, release)
+    envelope = Envelope().ramp(0, attack, 0, 1).ramp(attack, decay, 1, sustain_level)
+    return envelope.ramp(n_samples - release, release, sustain_level, 0)
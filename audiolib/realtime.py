@@ -0,0 +1,140 @@
+"""Callback-driven block processing for live effects.
+
+A BlockEngine runs a chain of stateful processors over small blocks of
+float32 audio, shaped (frames, channels). Each processor has a
+process(block) method that works in place and keeps whatever state it
+needs (LFO phase, filter memory) from one block to the next.
+
+The same engine.callback is handed to a sounddevice stream by run_live(),
+or driven from a WAV file at the same cadence by run_simulated(), so the
+DSP can be exercised and timed without any audio hardware. play_blocks()
+plays generated audio block by block as it is synthesized.
+"""
+
+import time
+
+import numpy as np
+
+from audiolib import wavio
+
+
+class BlockStats:
+    """Callback timing and dropout counts for a running engine."""
+
+    def __init__(self, block_seconds):
+        self.block_seconds = block_seconds
+        self.callbacks = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        # Callbacks that took longer than one block of audio.
+        self.overruns = 0
+        # Device-reported dropouts.
+        self.underflows = 0
+        self.overflows = 0
+
+    def record(self, elapsed, status=None):
+        self.callbacks += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        if elapsed > self.block_seconds:
+            self.overruns += 1
+        if status:
+            self.underflows += bool(status.output_underflow)
+            self.overflows += bool(status.input_overflow)
+
+    def __str__(self):
+        mean = self.total_time / self.callbacks if self.callbacks else 0
+        load = mean / self.block_seconds if self.block_seconds else 0
+        return (f"{self.callbacks} callbacks, mean {mean * 1e3:.3f} ms, max {self.max_time * 1e3:.3f} ms "
+                f"({load:.1%} of the {self.block_seconds * 1e3:.2f} ms block budget), "
+                f"{self.overruns} overruns, {self.underflows} underflows, {self.overflows} overflows")
+
+
+class BlockEngine:
+    """Runs processors over fixed-size blocks from a sounddevice-style callback."""
+
+    def __init__(self, processors, sample_rate, block_size=256, channels=1):
+        self.processors = list(processors)
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.channels = channels
+        self.buffer = np.zeros((block_size, channels), dtype=np.float32)
+        self.stats = BlockStats(block_size / sample_rate)
+
+    def process(self, block):
+        for processor in self.processors:
+            block = processor.process(block)
+        return block
+
+    def callback(self, indata, outdata, frames, time_info, status):
+        """sounddevice Stream callback: processes indata into outdata."""
+        start = time.perf_counter()
+        block = self.buffer[:frames]
+        block[:] = indata
+        outdata[:] = self.process(block)
+        self.stats.record(time.perf_counter() - start, status)
+
+
+def run_live(engine, device=None):
+    """Runs engine on a duplex sound device stream until interrupted."""
+    import sounddevice as sd
+
+    with sd.Stream(device=device, samplerate=engine.sample_rate, blocksize=engine.block_size,
+                   channels=engine.channels, dtype="float32", latency="low",
+                   callback=engine.callback):
+        print("Processing live audio, press Ctrl-C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+                print(engine.stats)
+        except KeyboardInterrupt:
+            pass
+    return engine.stats
+
+
+def play_blocks(blocks, sample_rate, channels=1, device=None):
+    """Plays float32 blocks on the sound device as they are generated.
+
+    Only one block needs to exist at a time, so an endless generator plays
+    in constant memory, and sound starts as soon as the first block is
+    ready. Stops at the end of blocks or on Ctrl-C.
+    """
+    import sounddevice as sd
+
+    with sd.OutputStream(device=device, samplerate=sample_rate, channels=channels, dtype="float32") as stream:
+        try:
+            for block in blocks:
+                stream.write(np.ascontiguousarray(block, dtype=np.float32).reshape(len(block), channels))
+        except KeyboardInterrupt:
+            pass
+
+
+def run_simulated(engine, source, sink, paced=False):
+    """Drives engine.callback from a WAV file into a 16-bit one, one block at a time.
+
+    With paced set, each callback waits for the moment a real device would
+    make it, and blocks that finish after their deadline are counted as
+    underflows, just as the device would report them.
+    """
+    frames = engine.block_size
+    indata = np.zeros((frames, engine.channels), dtype=np.float32)
+    outdata = np.zeros((frames, engine.channels), dtype=np.float32)
+    start = time.perf_counter()
+    with wavio.WavReader(source) as src, wavio.WavWriter(sink, engine.sample_rate, engine.channels) as dst:
+        if src.channels != engine.channels:
+            raise ValueError(f"{source}: expected {engine.channels} channel(s)")
+        for block_index, block in enumerate(src.blocks(frames, out=indata)):
+            n = len(block)
+            indata[n:] = 0
+
+            deadline = start + (block_index + 1) * engine.stats.block_seconds
+            if paced:
+                wait = deadline - engine.stats.block_seconds - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            engine.callback(indata, outdata, frames, None, None)
+            if paced and time.perf_counter() > deadline:
+                engine.stats.underflows += 1
+
+            dst.write(outdata[:n])
+    return engine.stats
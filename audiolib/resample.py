@@ -0,0 +1,274 @@
+"""Streaming polyphase sample-rate conversion.
+
+A rate change from in_rate to out_rate is done as a rational up/down
+ratio: conceptually, insert up - 1 zeros between input samples, low-pass
+filter, and keep every down-th sample. scipy.signal.upfirdn does this in
+polyphase form, never building the zero-stuffed signal or computing the
+discarded samples: each output sample is a short dot product of the input
+with one of the up phases of the filter, so the cost per output sample is
+the taps per phase, whatever the ratio.
+
+Ratios whose up or down is too large for an exact filter bank (44100 to
+47999 needs 47999 phases) go to FractionalResampler instead. It keeps a
+bank of PHASES phases and, for each output sample, interpolates between
+the two phases nearest its exact position, so any rate pair costs the
+same. resampler() picks between the two.
+
+Both take input a block at a time and keep the tail of the input they
+still need between calls, so a long file can be converted with no more
+memory than a block. Output is aligned with the input (the filter delay
+is taken out) and, once flushed, is exactly
+ceil(n_in * out_rate / in_rate) samples long. Filter designs are cached
+per ratio, so every track or block stream at the same rates shares one.
+"""
+
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+import scipy.signal as signal
+
+# Filter zero crossings on each side of the center tap.
+ZERO_CROSSINGS = 16
+KAISER_BETA = 8.0
+# Passband edge as a fraction of the lower Nyquist frequency.
+ROLLOFF = 0.9
+# Largest up or down factor given an exact polyphase filter.
+MAX_FACTOR = 1024
+# Phases in FractionalResampler's interpolated bank.
+PHASES = 512
+# Outputs FractionalResampler computes at once, to keep its gathers in cache.
+CHUNK = 2048
+
+
+def ratio(in_rate, out_rate):
+    """Returns (up, down) with out_rate / in_rate == up / down in lowest terms."""
+    g = gcd(int(in_rate), int(out_rate))
+    return int(out_rate) // g, int(in_rate) // g
+
+
+def taps_per_phase(up, down):
+    """Returns the taps each output sample needs: more when downsampling, as the filter is narrower.
+
+    The count is even, so the filter's center (its delay) falls on a
+    whole sample.
+    """
+    taps = -(-2 * ZERO_CROSSINGS * max(up, down) // up)
+    return taps + taps % 2
+
+
+@lru_cache(maxsize=32)
+def design(up, down):
+    """Returns the low-pass filter for an up/down ratio, at the upsampled rate, as float32.
+
+    The filter has an odd length, so its delay is a whole number of
+    upsampled samples, and spans a whole number of taps per phase. The
+    array is cached and read-only.
+    """
+    cutoff = ROLLOFF / max(up, down)
+    h = signal.firwin(taps_per_phase(up, down) * up - 1, cutoff, window=("kaiser", KAISER_BETA)) * up
+    h = h.astype(np.float32)
+    h.flags.writeable = False
+    return h
+
+
+@lru_cache(maxsize=32)
+def phase_bank(taps, cutoff):
+    """Returns a (PHASES + 1, taps + 1) bank of filter phases for FractionalResampler.
+
+    Row p holds the filter taps p / PHASES + j input samples from its
+    start, j = 0..taps, in reverse order; the extra last row is
+    the first shifted by one tap, so neighbouring rows can always be
+    interpolated. cutoff is relative to the input Nyquist frequency.
+    """
+    length = taps * PHASES + 1
+    h = signal.firwin(length, cutoff / PHASES, window=("kaiser", KAISER_BETA)) * PHASES
+    h = np.concatenate([h, np.zeros(PHASES - 1)])
+    bank = h.reshape(taps + 1, PHASES).T
+    bank = np.vstack([bank, np.append(bank[0, 1:], 0.0)])
+    bank = np.ascontiguousarray(bank[:, ::-1], dtype=np.float32)
+    bank.flags.writeable = False
+    return bank
+
+
+class Resampler:
+    """Converts a stream of (frames,) or (frames, channels) blocks from in_rate to out_rate."""
+
+    def __init__(self, in_rate, out_rate):
+        self.in_rate, self.out_rate = in_rate, out_rate
+        self.up, self.down = ratio(in_rate, out_rate)
+        self.filter = design(self.up, self.down)
+        self.taps = -(-len(self.filter) // self.up)
+        # Upsampled-domain delay of the filter, skipped so output lines up with input.
+        self.delay = (len(self.filter) - 1) // 2
+        # upfirdn only produces every down-th upsampled sample counting
+        # from the start of its input, so buffers must start on an input
+        # index i with i * up == delay (mod down).
+        self.alignment = self.delay * pow(self.up, -1, self.down) % self.down
+        self.history = None  # input samples still needed, starting at input index self.first
+        self.first = self._aligned(-(self.taps - 1))
+        self.n_in = 0
+        self.n_out = 0
+
+    def _aligned(self, index):
+        """Returns the nearest input index at or before index that buffers can start on."""
+        return index - (index - self.alignment) % self.down
+
+    def _available(self):
+        """Returns how many outputs in total the input received so far can produce."""
+        # Output m needs input up to (m * down + delay) // up.
+        last = self.n_in - 1
+        return max(0, ((last + 1) * self.up - 1 - self.delay) // self.down + 1)
+
+    def process(self, block):
+        """Takes the next input block and returns the output it completes (possibly none)."""
+        block = np.asarray(block, dtype=np.float32)
+        if self.history is None:
+            self.history = np.zeros((-self.first,) + block.shape[1:], dtype=np.float32)
+        buffer = np.concatenate([self.history, block])
+        self.n_in += len(block)
+        stop = self._available()
+        out = self._render(buffer, stop)
+        # Keep only the input the next output still needs.
+        keep = self._aligned((self.n_out * self.down + self.delay) // self.up - (self.taps - 1))
+        self.history = buffer[keep - self.first:]
+        self.first = keep
+        return out
+
+    def flush(self):
+        """Returns the rest of the output, as if the input were followed by silence."""
+        if self.history is None:
+            return np.zeros(0, dtype=np.float32)
+        total = -(-self.n_in * self.up // self.down)
+        tail = np.zeros((self.taps,) + self.history.shape[1:], dtype=np.float32)
+        buffer = np.concatenate([self.history, tail])
+        return self._render(buffer, total)
+
+    def _render(self, buffer, stop):
+        """Returns outputs n_out..stop - 1, computed from buffer (input from index self.first)."""
+        count = max(stop - self.n_out, 0)
+        # Output m is upsampled sample m * down + delay, counted from the buffer start.
+        start = (self.n_out * self.down + self.delay - self.first * self.up) // self.down
+        self.n_out += count
+        if count == 0:
+            return np.zeros((0,) + buffer.shape[1:], dtype=np.float32)
+        # Only pass upfirdn the input these outputs depend on.
+        end = (start + count - 1) * self.down // self.up + 1
+        return signal.upfirdn(self.filter, buffer[:end], self.up, self.down, axis=0)[start:start + count]
+
+    def blocks(self, blocks):
+        """Resamples a whole stream of input blocks, yielding output blocks."""
+        for block in blocks:
+            out = self.process(block)
+            if len(out):
+                yield out
+        out = self.flush()
+        if len(out):
+            yield out
+
+
+class FractionalResampler:
+    """Converts between any two rates, with the same interface as Resampler.
+
+    Output sample m sits at input position m * in_rate / out_rate, kept as
+    an exact fraction so long streams do not drift. Its filter taps are
+    interpolated linearly between the two nearest of PHASES precomputed
+    phases, then dotted with the inputs around that position.
+    """
+
+    def __init__(self, in_rate, out_rate):
+        self.in_rate, self.out_rate = int(in_rate), int(out_rate)
+        self.taps = taps_per_phase(self.out_rate, self.in_rate)
+        self.bank = phase_bank(self.taps, ROLLOFF * min(1.0, self.out_rate / self.in_rate))
+        # The filter is centered taps / 2 inputs after its start.
+        self.delay = self.taps // 2
+        self.history = None  # input samples still needed, starting at input index self.first
+        self.first = -self.taps
+        self.n_in = 0
+        self.n_out = 0
+
+    def _position(self, m):
+        """Returns (last input index, fraction past it) of the filter window of output(s) m."""
+        position = m * self.in_rate + self.delay * self.out_rate
+        return position // self.out_rate, position % self.out_rate / self.out_rate
+
+    def _available(self):
+        """Returns how many outputs in total the input received so far can produce."""
+        # Output m needs input up to its window's last index.
+        return max(0, ((self.n_in - self.delay) * self.out_rate - 1) // self.in_rate + 1)
+
+    def process(self, block):
+        """Takes the next input block and returns the output it completes (possibly none)."""
+        block = np.asarray(block, dtype=np.float32)
+        if self.history is None:
+            self.history = np.zeros((-self.first,) + block.shape[1:], dtype=np.float32)
+        buffer = np.concatenate([self.history, block])
+        self.n_in += len(block)
+        out = self._render(buffer, self._available())
+        keep = self._position(self.n_out)[0] - self.taps
+        self.history = buffer[keep - self.first:]
+        self.first = keep
+        return out
+
+    def flush(self):
+        """Returns the rest of the output, as if the input were followed by silence."""
+        if self.history is None:
+            return np.zeros(0, dtype=np.float32)
+        total = -(-self.n_in * self.out_rate // self.in_rate)
+        tail = np.zeros((self.taps + 1,) + self.history.shape[1:], dtype=np.float32)
+        return self._render(np.concatenate([self.history, tail]), total)
+
+    def _render(self, buffer, stop):
+        """Returns outputs n_out..stop - 1, computed from buffer (input from index self.first)."""
+        chunks = [self._render_chunk(buffer, min(start + CHUNK, stop)) for start in range(self.n_out, stop, CHUNK)]
+        if not chunks:
+            return np.zeros((0,) + buffer.shape[1:], dtype=np.float32)
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+    def _render_chunk(self, buffer, stop):
+        m = np.arange(self.n_out, stop)
+        self.n_out += len(m)
+        last, fraction = self._position(m)
+        # The window is the taps + 1 inputs up to `last`. The output sits
+        # a fraction f past `last`, so input last - j meets the filter
+        # f + j samples from its start: between rows p and p + 1 of the
+        # bank, for p = floor(f * PHASES).
+        offset = fraction * PHASES
+        row = np.minimum(offset.astype(np.intp), PHASES - 1)
+        weight = (offset - row).astype(np.float32)[:, None]
+        coefficients = self.bank[row] * (1 - weight)
+        coefficients += self.bank[row + 1] * weight
+        start = last - self.taps - self.first
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, self.taps + 1, axis=0)[start]
+        if buffer.ndim == 1:
+            return np.einsum("mt,mt->m", coefficients, windows)
+        return np.einsum("mt,mct->mc", coefficients, windows)
+
+    def blocks(self, blocks):
+        """Resamples a whole stream of input blocks, yielding output blocks."""
+        return Resampler.blocks(self, blocks)
+
+
+def resampler(in_rate, out_rate):
+    """Returns an exact polyphase Resampler when the ratio is small enough, else a FractionalResampler."""
+    up, down = ratio(in_rate, out_rate)
+    if max(up, down) <= MAX_FACTOR:
+        return Resampler(in_rate, out_rate)
+    return FractionalResampler(in_rate, out_rate)
+
+
+def resample(data, in_rate, out_rate):
+    """Resamples a whole (frames,) or (frames, channels) array.
+
+    Integer samples come back rounded and clipped to the same type; float
+    ones come back as float32.
+    """
+    data = np.asarray(data)
+    if in_rate == out_rate:
+        return data if np.issubdtype(data.dtype, np.integer) else data.astype(np.float32, copy=False)
+    converter = resampler(in_rate, out_rate)
+    out = np.concatenate([converter.process(data), converter.flush()])
+    if np.issubdtype(data.dtype, np.integer):
+        info = np.iinfo(data.dtype)
+        out = np.clip(np.rint(out), info.min, info.max).astype(data.dtype)
+    return out
@@ -0,0 +1,239 @@
+"""Wavetable oscillators with cached, band-limited single-cycle tables.
+
+Each wave style is stored as one cycle of TABLE_SIZE samples, built from
+its Fourier series with only as many harmonics as fit below Nyquist for
+the frequency being played. Tables are built once per (style, harmonic
+count) and cached; rendering is a phase accumulator plus a linearly
+interpolated table lookup, so no transcendental functions are evaluated
+per sample and the square/saw/triangle waves do not alias.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+TABLE_BITS = 11
+TABLE_SIZE = 1 << TABLE_BITS
+
+# Oscillator phase is 32-bit fixed point: one cycle is PHASE_ONE.
+PHASE_ONE = 1 << 32
+FRACTION_BITS = 32 - TABLE_BITS
+FRACTION_MASK = (1 << FRACTION_BITS) - 1
+
+# Most harmonics a TABLE_SIZE-sample cycle can hold.
+MAX_HARMONICS = TABLE_SIZE // 2 - 1
+
+STYLES = ("sine", "square", "triangle", "sawtooth")
+
+# Samples (tones x columns) rendered per pass over a bank, to bound its temporaries.
+BANK_CHUNK = 1 << 20
+
+
+def style_partials(style, harmonics):
+    """Returns (amplitudes, phases) of the sine partials 1..harmonics of a wave style.
+
+    The series match the naive waveforms popgen used to compute directly:
+    square is sign(sin), sawtooth rises from -1 to 1 through 0 at phase 0,
+    and triangle starts at -1.
+    """
+    k = np.arange(1, harmonics + 1)
+    phases = np.zeros(harmonics)
+    if style == "sine":
+        amps = (k == 1).astype(float)
+    elif style == "square":
+        amps = np.where(k % 2 == 1, 4 / (np.pi * k), 0)
+    elif style == "sawtooth":
+        amps = 2 / (np.pi * k) * (-1.0) ** (k + 1)
+    elif style == "triangle":
+        # -cos(kx) == sin(kx - pi/2)
+        amps = np.where(k % 2 == 1, 8 / (np.pi * k) ** 2, 0)
+        phases[:] = -np.pi / 2
+    else:
+        raise ValueError(f"Bad wave style: {style}")
+    return amps, phases
+
+
+def build_table(amplitudes, phases=None):
+    """Builds one cycle from sine partial amplitudes (harmonic 1 first) by inverse FFT.
+
+    The returned table has one guard sample appended (a copy of sample 0) so
+    interpolation never has to wrap an index.
+    """
+    amplitudes = np.asarray(amplitudes, dtype=float)[:MAX_HARMONICS]
+    if phases is None:
+        phases = np.zeros(len(amplitudes))
+    phases = np.asarray(phases, dtype=float)[:len(amplitudes)]
+    spectrum = np.zeros(TABLE_SIZE // 2 + 1, dtype=complex)
+    # a * sin(kx + p) has rfft coefficient -1j * a * e^{jp} * N / 2
+    spectrum[1:len(amplitudes) + 1] = -0.5j * TABLE_SIZE * amplitudes * np.exp(1j * phases)
+    table = np.fft.irfft(spectrum, TABLE_SIZE)
+    return np.append(table, table[0])
+
+
+def harmonic_limit(frequency, sample_rate):
+    """Returns how many harmonics of `frequency` fit below Nyquist, rounded down to a power of two.
+
+    Rounding to a power of two keeps the number of distinct tables per style
+    to about one per octave.
+    """
+    if frequency <= 0:
+        return MAX_HARMONICS
+    fit = int(sample_rate / 2 / frequency)
+    if fit < 1:
+        return 1
+    return min(1 << (fit.bit_length() - 1), MAX_HARMONICS)
+
+
+@lru_cache(maxsize=None)
+def style_table(style, harmonics):
+    """Returns the cached table for `style` band-limited to `harmonics` partials."""
+    if style == "sine":
+        harmonics = 1
+    table = build_table(*style_partials(style, harmonics)).astype(np.float32)
+    table.flags.writeable = False
+    return table
+
+
+@lru_cache(maxsize=None)
+def stack_table(amplitudes, harmonics):
+    """Returns the cached table for a tuple of partial amplitudes, keeping at most `harmonics` of them."""
+    table = build_table(amplitudes[:harmonics]).astype(np.float32)
+    table.flags.writeable = False
+    return table
+
+
+class Oscillator:
+    """Phase-accumulator oscillator reading a single-cycle table.
+
+    The phase is a 32-bit fixed-point fraction of a cycle, so it wraps for
+    free in unsigned arithmetic: the top TABLE_BITS bits index the table and
+    the rest give the interpolation fraction. Successive calls to render()
+    continue with the phase the last call ended on, so a long tone can be
+    produced block by block. Output is float32.
+    """
+
+    def __init__(self, table, frequency, sample_rate, phase=0.0):
+        self.table = np.asarray(table, dtype=np.float32)
+        self.sample_rate = sample_rate
+        self.increment = np.uint32(round(frequency * PHASE_ONE / sample_rate) % PHASE_ONE)
+        # `phase` is given in cycles.
+        self.phase = np.uint32(round(phase * PHASE_ONE) % PHASE_ONE)
+
+    def render(self, n, out=None):
+        """Renders the next `n` samples, into `out` if given."""
+        phase = np.arange(n, dtype=np.uint32)
+        phase *= self.increment
+        phase += self.phase
+        self.phase = np.uint32((int(self.phase) + n * int(self.increment)) % PHASE_ONE)
+
+        index = phase >> np.uint32(FRACTION_BITS)
+        frac = (phase & np.uint32(FRACTION_MASK)).astype(np.float32)
+        frac *= np.float32(1 / (1 << FRACTION_BITS))
+        lo = self.table.take(index)
+        hi = self.table.take(index + 1)
+        hi -= lo
+        hi *= frac
+        if out is None:
+            out = lo
+            out += hi
+        else:
+            np.add(lo, hi, out=out)
+        return out
+
+    def blocks(self, block_size, n_samples=None, out=None):
+        """Yields the next n_samples (forever if None) as float32 blocks of block_size.
+
+        The last block may be shorter. With out given, every block is a
+        view into it and is overwritten by the next one.
+        """
+        remaining = n_samples
+        while remaining is None or remaining > 0:
+            n = block_size if remaining is None else min(block_size, remaining)
+            yield self.render(n, None if out is None else out[:n])
+            if remaining is not None:
+                remaining -= n
+
+
+def table_bank_blocks(table, frequencies, n_samples, sample_rate):
+    """Yields render_table_bank's output in column slices, as (start, block) pairs.
+
+    Each block is a (len(frequencies), columns) float32 array covering
+    samples [start, start + columns), sized so a pass touches about
+    BANK_CHUNK samples: the Oscillator lookup broadcast over a column of
+    phase increments, with temporaries that stay the same size however
+    many tones or samples there are. Blocks are fresh arrays the caller
+    may scale or convert in place.
+    """
+    table = np.asarray(table, dtype=np.float32)
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    increments = (np.round(frequencies * PHASE_ONE / sample_rate) % PHASE_ONE).astype(np.uint32)
+    columns = max(1, BANK_CHUNK // max(len(frequencies), 1))
+    for start in range(0, n_samples, columns):
+        phase = np.arange(start, min(start + columns, n_samples), dtype=np.uint32)[None, :] * increments[:, None]
+        index = phase >> np.uint32(FRACTION_BITS)
+        frac = (phase & np.uint32(FRACTION_MASK)).astype(np.float32)
+        frac *= np.float32(1 / (1 << FRACTION_BITS))
+        out = table.take(index)
+        hi = table.take(index + 1)
+        hi -= out
+        hi *= frac
+        out += hi
+        yield start, out
+
+
+def render_table_bank(table, frequencies, n_samples, sample_rate, out=None):
+    """Renders one table at many frequencies at once, as a (len(frequencies), n_samples) float32 array.
+
+    The tones are rendered a slice of columns at a time (see
+    table_bank_blocks) into out, if given, so a whole set of same-length
+    tones costs only its output.
+    """
+    if out is None:
+        out = np.empty((len(frequencies), n_samples), dtype=np.float32)
+    for start, block in table_bank_blocks(table, frequencies, n_samples, sample_rate):
+        out[:, start:start + block.shape[1]] = block
+    return out
+
+
+def bank_blocks(style, frequencies, n_samples, sample_rate):
+    """Yields a wave style at many frequencies in column slices; see table_bank_blocks.
+
+    The table is band-limited for the highest frequency in the bank.
+    """
+    table = style_table(style, harmonic_limit(max(frequencies), sample_rate))
+    return table_bank_blocks(table, frequencies, n_samples, sample_rate)
+
+
+def render_bank(style, frequencies, n_samples, sample_rate, out=None):
+    """Renders a wave style at many frequencies at once; see render_table_bank.
+
+    The table is band-limited for the highest frequency in the bank.
+    """
+    table = style_table(style, harmonic_limit(max(frequencies), sample_rate))
+    return render_table_bank(table, frequencies, n_samples, sample_rate, out)
+
+
+def oscillator(style, frequency, sample_rate, phase=0.0):
+    """Returns an Oscillator for a wave style, band-limited for `frequency`."""
+    table = style_table(style, harmonic_limit(frequency, sample_rate))
+    return Oscillator(table, frequency, sample_rate, phase)
+
+
+def stack_oscillator(amplitudes, frequency, sample_rate, phase=0.0):
+    """Returns an Oscillator for a stack of sine partials, harmonic 1 first."""
+    amplitudes = tuple(float(a) for a in amplitudes)
+    # Stacks are short, so keep every partial that fits rather
+    # than rounding down to a power of two.
+    fit = int(sample_rate / 2 / frequency) if frequency > 0 else len(amplitudes)
+    table = stack_table(amplitudes, max(1, min(fit, len(amplitudes))))
+    return Oscillator(table, frequency, sample_rate, phase)
+
+
+def render(style, frequency, n_samples, sample_rate):
+    """Renders `n_samples` of a wave style at `frequency`."""
+    return oscillator(style, frequency, sample_rate).render(n_samples)
+
+
+def render_stack(amplitudes, frequency, n_samples, sample_rate):
+    """Renders `n_samples` of a harmonic stack at `frequency`."""
+    return stack_oscillator(amplitudes, frequency, sample_rate).render(n_samples)
@@ -0,0 +1,270 @@
+"""WAV file reading and writing shared by all the tools.
+
+WavReader memory-maps the data chunk, so opening a file is instant whatever
+its size and frames are NumPy views onto the file: nothing is read until it
+is touched. It handles 8/16/24/32-bit PCM and 32/64-bit float files.
+WavWriter streams blocks to disk and fixes up the header sizes on close.
+"""
+
+import struct
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavReader:
+    """Memory-mapped WAV file.
+
+    frames is an (n_frames, channels) view of the samples in their stored
+    type, except for 24-bit files, which have no NumPy type: there, frames
+    is an (n_frames, channels, 3) view of the raw bytes and channel(),
+    read() and blocks() do the conversion.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+            if riff != b"RIFF" or wave_id != b"WAVE":
+                raise ValueError(f"{filename}: not a RIFF WAVE file")
+            fmt = None
+            data_offset = data_size = None
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+                chunk_id, size = struct.unpack("<4sI", header)
+                if chunk_id == b"fmt ":
+                    fmt = f.read(size)
+                elif chunk_id == b"data":
+                    data_offset = f.tell()
+                    data_size = size
+                    break
+                else:
+                    f.seek(size, 1)
+                if size % 2:
+                    f.seek(1, 1)
+            file_size = f.seek(0, 2)
+
+        if fmt is None or data_offset is None:
+            raise ValueError(f"{filename}: missing fmt or data chunk")
+        tag, self.channels, self.sample_rate, _, self.block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+        if tag == WAVE_FORMAT_EXTENSIBLE:
+            tag = struct.unpack("<H", fmt[24:26])[0]
+        self.sample_width = bits // 8
+        self.is_float = tag == WAVE_FORMAT_IEEE_FLOAT
+        if tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+            raise ValueError(f"{filename}: unsupported WAV format tag {tag:#x}")
+
+        # A writer that never got to fix its header leaves size 0 (or junk).
+        available = file_size - data_offset
+        if data_size == 0 or data_size > available:
+            data_size = available
+        self.n_frames = data_size // self.block_align
+
+        if self.is_float:
+            if self.sample_width not in (4, 8):
+                raise ValueError(f"{filename}: unsupported float width {bits}")
+            self.dtype = np.dtype(f"<f{self.sample_width}")
+        elif self.sample_width == 1:
+            self.dtype = np.dtype(np.uint8)
+        elif self.sample_width in (2, 4):
+            self.dtype = np.dtype(f"<i{self.sample_width}")
+        elif self.sample_width == 3:
+            self.dtype = np.dtype(np.int32)
+        else:
+            raise ValueError(f"{filename}: unsupported sample width {bits}")
+
+        if self.n_frames == 0:
+            shape = (0, self.channels) if self.sample_width != 3 else (0, self.channels, 3)
+            self.frames = np.zeros(shape, dtype=self.dtype if self.sample_width != 3 else np.uint8)
+        elif self.sample_width == 3:
+            self.frames = np.memmap(filename, dtype=np.uint8, mode="r", offset=data_offset,
+                                    shape=(self.n_frames, self.channels, 3))
+        else:
+            self.frames = np.memmap(filename, dtype=self.dtype, mode="r", offset=data_offset,
+                                    shape=(self.n_frames, self.channels))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.n_frames
+
+    @property
+    def duration(self):
+        return self.n_frames / self.sample_rate
+
+    def close(self):
+        """Drops the mapping. Views already handed out stay valid."""
+        self.frames = None
+
+    def samples(self, start=0, stop=None, channels=None):
+        """Returns frames[start:stop] in their stored integer or float type.
+
+        channels is an int (giving a 1-D result) or a list of channel numbers.
+        For everything but 24-bit files this is a view, not a copy.
+        """
+        frames = self.frames[start:stop]
+        if channels is not None:
+            frames = frames[:, channels]
+        if self.sample_width == 3:
+            return int24_to_int32(frames)
+        return frames
+
+    def channel(self, c):
+        """Returns all of channel c, lazily, in its stored type."""
+        return self.samples(channels=c)
+
+    def read(self, start=0, stop=None, channels=None, out=None):
+        """Returns frames[start:stop] as float32 scaled to [-1, 1), into out if given."""
+        return to_float(self.samples(start, stop, channels), self.sample_width, self.is_float, out)
+
+    def blocks(self, block_size, channels=None, out=None):
+        """Yields float32 blocks of up to block_size frames.
+
+        If out is given (at least block_size frames long), every block is
+        written into it and a view of it is yielded, so a whole file can be
+        processed with a single buffer.
+        """
+        for start in range(0, self.n_frames, block_size):
+            stop = min(start + block_size, self.n_frames)
+            yield self.read(start, stop, channels, None if out is None else out[:stop - start])
+
+
+def int24_to_int32(raw):
+    """Converts (..., 3) little-endian 24-bit sample bytes to int32."""
+    wide = np.zeros(raw.shape[:-1] + (4,), dtype=np.uint8)
+    wide[..., 1:] = raw
+    # Shifting right by 8 sign-extends the top byte.
+    return wide.view("<i4")[..., 0] >> 8
+
+
+def to_float(samples, sample_width, is_float=False, out=None):
+    """Converts stored samples to float32 in [-1, 1)."""
+    if out is None:
+        out = np.empty(samples.shape, dtype=np.float32)
+    if is_float:
+        np.copyto(out, samples, casting="same_kind")
+    elif sample_width == 1:
+        np.subtract(samples, np.float32(128), out=out, casting="unsafe")
+        out *= np.float32(1 / 128)
+    else:
+        np.multiply(samples, np.float32(1 / 2 ** (8 * sample_width - 1)), out=out, casting="unsafe")
+    return out
+
+
+def header(sample_rate, channels, n_frames, sample_width=2, is_float=False):
+    """Returns the 44-byte header of a WAV file holding n_frames frames.
+
+    A stream whose length is known up front can send this and then the
+    encoded blocks, with no need to seek back and fix the sizes.
+    """
+    data_size = n_frames * channels * sample_width
+    block_align = channels * sample_width
+    tag = WAVE_FORMAT_IEEE_FLOAT if is_float else WAVE_FORMAT_PCM
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size + data_size % 2, b"WAVE",
+        b"fmt ", 16, tag, channels, sample_rate,
+        sample_rate * block_align, block_align, 8 * sample_width,
+        b"data", data_size,
+    )
+
+
+def encode(block, sample_width=2, is_float=False):
+    """Converts a block to the bytes-ready array stored in a WAV file.
+
+    Float blocks are clipped to [-1, 1] and quantized to sample_width
+    (unless is_float); integer blocks must already match it.
+    """
+    width = sample_width
+    if is_float:
+        return block.astype(f"<f{width}", copy=False)
+    if block.dtype.kind == "f":
+        scale = 2 ** (8 * width - 1) - 1
+        ints = np.rint(np.clip(block, -1, 1) * scale)
+        if width == 1:
+            ints += 128
+        block = ints.astype(np.int32 if width >= 3 else (np.uint8 if width == 1 else np.int16))
+    if width == 3:
+        return block.astype("<i4").view(np.uint8).reshape(block.shape + (4,))[..., :3]
+    return block.astype(np.uint8 if width == 1 else f"<i{width}", copy=False)
+
+
+class WavWriter:
+    """Streams frames to a WAV file, fixing up the header sizes on close.
+
+    Float blocks are clipped to [-1, 1] and quantized to the file's sample
+    width (unless writing a float file); integer blocks are written as they
+    are and must already match the sample width.
+    """
+
+    def __init__(self, filename, sample_rate, channels=1, sample_width=2, is_float=False):
+        if is_float and sample_width not in (4, 8):
+            raise ValueError("float WAV files have 4- or 8-byte samples")
+        if not is_float and sample_width not in (1, 2, 3, 4):
+            raise ValueError(f"unsupported sample width {sample_width}")
+        self.filename = filename
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.is_float = is_float
+        self.n_frames = 0
+        self.file = open(filename, "wb")
+        self._write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_header(self):
+        self.file.write(header(self.sample_rate, self.channels, self.n_frames,
+                               self.sample_width, self.is_float))
+
+    def write(self, block):
+        """Appends a (frames,) or (frames, channels) block."""
+        block = np.asarray(block)
+        if block.ndim == 1:
+            block = block[:, None]
+        if block.shape[1] != self.channels:
+            raise ValueError(f"expected {self.channels} channel(s), got {block.shape[1]}")
+        self.file.write(self.encode(block).tobytes())
+        self.n_frames += len(block)
+
+    def encode(self, block):
+        """Converts a block to the bytes-ready array stored in the file."""
+        return encode(block, self.sample_width, self.is_float)
+
+    def close(self):
+        if self.file is None:
+            return
+        data_size = self.n_frames * self.channels * self.sample_width
+        if data_size % 2:
+            self.file.write(b"\0")
+        self.file.seek(0)
+        self._write_header()
+        self.file.close()
+        self.file = None
+
+
+def read(filename):
+    """Returns (sample_rate, frames) with frames a float32 (n_frames, channels) array."""
+    with WavReader(filename) as reader:
+        return reader.sample_rate, reader.read()
+
+
+def write(filename, data, sample_rate, sample_width=2, is_float=False):
+    """Writes a whole (frames,) or (frames, channels) array to a WAV file."""
+    data = np.asarray(data)
+    channels = 1 if data.ndim == 1 else data.shape[1]
+    with WavWriter(filename, sample_rate, channels, sample_width, is_float) as writer:
+        writer.write(data)
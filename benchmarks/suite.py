@@ -0,0 +1,245 @@
+"""Benchmark suite: the hot path of every tool, timed and memory-profiled.
+
+    python benchmarks/suite.py                        # run everything, print a table
+    python benchmarks/suite.py -o baseline.json       # save results as JSON
+    python benchmarks/suite.py --baseline baseline.json -o now.json
+    python benchmarks/suite.py -k popgen --profile prof/
+
+Every case runs on synthetic input (seeded noise and tones), so no audio
+files or sound device are needed. Each case is timed over --repeat samples
+of at least 0.2 s each (best and median time per call), then run once
+more under tracemalloc for its peak allocation, which covers NumPy arrays.
+
+With --baseline, each case is compared against the same case in an
+earlier JSON result, and the exit status is 1 if any got slower (best
+time) or hungrier (peak memory) than --threshold allows. --profile writes
+a cProfile dump (<case>.prof, for pstats or snakeviz) and the top
+tracemalloc allocation sites (<case>.mem.txt) for every case it runs.
+"""
+
+import argparse
+import atexit
+import cProfile
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, root)
+for tool in ("popgen", "tone_control", "wah", "one_perfect_note", "multitrack"):
+    sys.path.insert(0, os.path.join(root, tool))
+import multitrack
+import popgen
+import tone_equalizer
+import trumpet
+import wah
+from audiolib import resample, wavio
+
+SAMPLE_RATE = 44100
+
+
+def noise(seconds, channels=None, sample_rate=SAMPLE_RATE, seed=0):
+    """Seeded full-band test signal, float32, shaped (n,) or (n, channels)."""
+    n = int(seconds * sample_rate)
+    shape = (n,) if channels is None else (n, channels)
+    return np.random.default_rng(seed).uniform(-0.5, 0.5, shape).astype(np.float32)
+
+
+def cases(quick=False):
+    """Yields (name, params, make) for every benchmark.
+
+    make() does the untimed setup and returns the function to time, so
+    inputs are built once per case, not once per run.
+    """
+    lengths = (1, 4) if quick else (1, 4, 16)
+    seconds = (10, 60) if quick else (10, 60, 300)
+
+    for style in popgen.wave_styles:
+        def make(style=style):
+            gen = popgen.PopGen(wave_style=style)
+            rng = np.random.default_rng(0)
+            return lambda: gen.make_note(72, n=1, rng=rng)
+        yield f"popgen.make_note[{style}]", {"style": style, "beats": 1}, make
+
+    for loops in lengths:
+        def make(loops=loops):
+            # A fresh note cache every run, so each render is cold.
+            return lambda: popgen.PopGen(note_cache=popgen.NoteCache()).render(seed=1, loops=loops)
+        yield f"popgen.render[loops={loops}]", {"loops": loops}, make
+
+    for s in seconds:
+        def make(s=s):
+            wave = noise(s)
+            return lambda: tone_equalizer.apply_tone_filter(wave, SAMPLE_RATE, 1.0, 0.5, 1.5)
+        yield f"tone.apply_tone_filter[{s}s]", {"seconds": s}, make
+
+        def make(s=s):
+            wave = noise(s)
+            return lambda: tone_equalizer.fft_energy_bands(wave, SAMPLE_RATE)
+        yield f"tone.fft_energy_bands[{s}s]", {"seconds": s}, make
+
+    for mode in ("am", "filter"):
+        for channels in (1, 2):
+            def make(mode=mode, channels=channels):
+                wave = noise(30, None if channels == 1 else channels)
+                out = np.empty_like(wave)
+                return lambda: wah.apply_wah_effect(wave, SAMPLE_RATE, 1.0, 0.5, out=out, mode=mode)
+            label = "mono" if channels == 1 else "stereo"
+            yield f"wah.apply_wah_effect[{mode},{label}]", {"mode": mode, "channels": channels, "seconds": 30}, make
+
+    for duration in (1, 10):
+        def make(duration=duration):
+            return lambda: trumpet.generate_trumpet_wave(440.0, duration=duration)
+        yield f"trumpet.generate_trumpet_wave[{duration}s]", {"seconds": duration}, make
+
+    for timbre in sorted(trumpet.timbres):
+        def make(timbre=timbre):
+            return lambda: trumpet.generate_trumpet_wave(220.0, duration=10, timbre=timbre)
+        yield f"trumpet.timbre[{timbre}]", {"timbre": timbre, "seconds": 10}, make
+
+    def make():
+        # Two 30 s stereo files, one at 48 kHz so it is resampled as it is mixed.
+        directory = tempfile.mkdtemp()
+        atexit.register(shutil.rmtree, directory, True)
+        names = [os.path.join(directory, f"{rate}.wav") for rate in (SAMPLE_RATE, 48000)]
+        for name, rate in zip(names, (SAMPLE_RATE, 48000)):
+            wavio.write(name, noise(30, 2, rate), rate)
+
+        def run():
+            tracks = multitrack.open_tracks(names, [0.0, -6.0], [0.0, 1.0], SAMPLE_RATE, 2, 65536)
+            multitrack.mix(tracks, SAMPLE_RATE, 2)
+        return run
+    yield "multitrack.mix[2x30s,resampled]", {"tracks": 2, "seconds": 30}, make
+
+    for in_rate, out_rate in ((44100, 48000), (48000, 44100), (44100, 47999)):
+        def make(in_rate=in_rate, out_rate=out_rate):
+            wave = noise(30, 2, in_rate)
+
+            def run():
+                converter = resample.resampler(in_rate, out_rate)
+                for start in range(0, len(wave), 65536):
+                    converter.process(wave[start:start + 65536])
+                converter.flush()
+            return run
+        yield f"resample.stream[{in_rate}->{out_rate}]", {"in_rate": in_rate, "out_rate": out_rate, "seconds": 30}, make
+
+
+def measure(f, repeat):
+    """Returns the (best, median) wall time of one f() call over repeat samples.
+
+    Each sample calls f() enough times to take at least 0.2 s, so even
+    sub-millisecond cases are timed well above the clock's noise.
+    """
+    timer = timeit.Timer(f)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat, number)]
+    return min(times), statistics.median(times)
+
+
+def peak_memory(f):
+    """Returns the peak bytes allocated while f() runs."""
+    tracemalloc.start()
+    try:
+        f()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def profile(f, name, directory, top=15):
+    """Dumps cProfile stats and the top allocation sites of one f() run into directory."""
+    filename = os.path.join(directory, re.sub(r"[^\w.=,-]+", "_", name))
+    cProfile.runctx("f()", globals(), {"f": f}, filename + ".prof")
+    tracemalloc.start(25)
+    try:
+        f()
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    with open(filename + ".mem.txt", "w") as out:
+        for stat in snapshot.statistics("lineno")[:top]:
+            print(stat, file=out)
+
+
+def compare(results, baseline, threshold):
+    """Prints each case against the baseline; returns the names of the regressed cases."""
+    before = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'case':<44} {'time':>8} {'memory':>8}")
+    for result in results:
+        old = before.get(result["name"])
+        if old is None:
+            print(f"{result['name']:<44} {'new':>8}")
+            continue
+        time_ratio = result["best"] / old["best"]
+        memory_ratio = result["peak_bytes"] / old["peak_bytes"] if old["peak_bytes"] else 1.0
+        regressed = time_ratio > threshold or memory_ratio > threshold
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{result['name']:<44} {time_ratio:>7.2f}x {memory_ratio:>7.2f}x{flag}")
+        if regressed:
+            regressions.append(result["name"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and memory-profile every tool's hot path.")
+    parser.add_argument("-k", "--select", help="Only run cases whose name matches this regular expression")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Timed samples per case")
+    parser.add_argument("--quick", action="store_true", help="Skip the largest input sizes")
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Ratio to the baseline above which a case counts as a regression")
+    parser.add_argument("--profile", metavar="DIR", help="Write cProfile and tracemalloc dumps here")
+    args = parser.parse_args()
+
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+
+    results = []
+    print(f"{'case':<44} {'best':>10} {'median':>10} {'peak':>10}")
+    for name, params, make in cases(args.quick):
+        if args.select and not re.search(args.select, name):
+            continue
+        f = make()
+        best, median = measure(f, args.repeat)
+        peak = peak_memory(f)
+        if args.profile:
+            profile(f, name, args.profile)
+        results.append({"name": name, "params": params, "best": best, "median": median, "peak_bytes": peak})
+        print(f"{name:<44} {best * 1e3:>8.2f}ms {median * 1e3:>8.2f}ms {peak / 2**20:>8.1f}MiB")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.2f}x the baseline")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
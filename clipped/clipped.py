@@ -1,66 +1,76 @@
 import numpy as np
-import wave
-import sounddevice as sd
+import os
+import sys
 import time
 import argparse
 
-parser = argparse.ArgumentParser( 
-    description="Generate and play sine wave audio. And then do it again but clipped and different sounding.")
-parser.add_argument('-p', '--pause', action='store_true', help="Add a 1/2 second  pause between playbacks.")
-parser.add_argument('-v', '--verbose', action='store_true', help="Enable verbose output.")
-args = parser.parse_args()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from audiolib import wavio
 
 sample_rate = 44100       # samples per second
 duration    = 1.0         # duration in seconds
 frequency   = 440.0       # frequency of the sine wave (in Hz)
 amplitude   = 32767       # max amplitude for 16-bit audio
+clip_limit  = 8192        # clipping threshold for the clipped wave
 
-# Generate the sine wave
-t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-sin_waveform = amplitude * 0.25 * np.sin(2 * np.pi * frequency * t)
-sin_waveform = sin_waveform.astype(np.int16)
+def generate_sine_wave(frequency=frequency, duration=duration, sample_rate=sample_rate, level=0.25):
+    """Returns a 16-bit sine wave at the given fraction of full scale."""
+    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
+    waveform = amplitude * level * np.sin(2 * np.pi * frequency * t)
+    return waveform.astype(np.int16)
 
-# Write the original sine wave to 'sin.wav'
-if args.verbose:
-    print("Writing sin.wav...")
-with wave.open('sin.wav', 'w') as wav_file:
-    wav_file.setnchannels(1) # mono audio
-    wav_file.setsampwidth(2) # 16-bit audio
-    wav_file.setframerate(sample_rate)
-    wav_file.writeframes(sin_waveform.tobytes())
+def generate_clipped_wave(frequency=frequency, duration=duration, sample_rate=sample_rate, limit=clip_limit):
+    """Returns a half-scale 16-bit sine wave clipped to +/- limit."""
+    waveform = generate_sine_wave(frequency, duration, sample_rate, level=0.5)
+    return np.clip(waveform, -limit, limit)
 
-# Clipping the waveform: limit values to ±8192
-t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-clipped_waveform = amplitude * 0.5 * np.sin(2 * np.pi * frequency * t)
-clipped_waveform = clipped_waveform.astype(np.int16)
-clip_limit = 8192
-clipped_waveform = np.clip(clipped_waveform, -clip_limit, clip_limit)
+def main():
+    parser = argparse.ArgumentParser( 
+        description="Generate and play sine wave audio. And then do it again but clipped and different sounding.")
+    parser.add_argument('-p', '--pause', action='store_true', help="Add a 1/2 second  pause between playbacks.")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Enable verbose output.")
+    parser.add_argument('-r', '--samplerate', type=int, default=sample_rate, help="Sample rate of the sounds and files (default 44100).")
+    args = parser.parse_args()
+    rate = args.samplerate
 
-# Write the clipped waveform to 'clipped.wav'
-if args.verbose:
-    print("Writing clipped.wav...")
-with wave.open('clipped.wav', 'w') as wav_file:
-    wav_file.setnchannels(1)           # mono audio
-    wav_file.setsampwidth(2)           # 16-bit audio
-    wav_file.setframerate(sample_rate) # sample rate
-    wav_file.writeframes(clipped_waveform.tobytes())
+    # Generate the sine wave
+    sin_waveform = generate_sine_wave(sample_rate=rate)
 
-# Play the original sine wave
-if args.verbose:
-    print("Playing generated sound...")
-sd.play(sin_waveform, sample_rate)
-sd.wait()
+    # Write the original sine wave to 'sin.wav'
+    if args.verbose:
+        print("Writing sin.wav...")
+    wavio.write('sin.wav', sin_waveform, rate) # mono 16-bit audio
+
+    # Clipping the waveform: limit values to ±8192
+    clipped_waveform = generate_clipped_wave(sample_rate=rate)
+
+    # Write the clipped waveform to 'clipped.wav'
+    if args.verbose:
+        print("Writing clipped.wav...")
+    wavio.write('clipped.wav', clipped_waveform, rate) # mono 16-bit audio
+
+    # Only needed for playback, so writing the files works without it
+    import sounddevice as sd
+
+    # Play the original sine wave
+    if args.verbose:
+        print("Playing generated sound...")
+    sd.play(sin_waveform, rate)
+    sd.wait()
+
+    # Pause
+    if args.pause:
+        if args.verbose:
+            print("Pausing...")
+        time.sleep(0.5)
 
-# Pause
-if args.pause:
+    # Play the clipped sine wave
     if args.verbose:
-        print("Pausing...")
-    time.sleep(0.5)
+        print("Playing clipped sound...")
+    sd.play(clipped_waveform, rate)
+    sd.wait()
 
-# Play the clipped sine wave
-if args.verbose:
-    print("Playing clipped sound...")
-sd.play(clipped_waveform, sample_rate)
-sd.wait()
+    print("Thank you for running this program.")
 
-print("Thank you for running this program.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Effects stacker: runs a WAV through a chain of effects in one pass.
+
+The file is read once, a block at a time, into a single float32 buffer.
+Every stage (tone control, wah, clipping) works on that buffer in place,
+and the result is quantized to 16 bits only once, as it is written out.
+Chains come from presets in a JSON file, for example:
+
+    {"rainy": [{"effect": "tone", "band_gains": [1.4, 1.0, 0.6]},
+               {"effect": "wah", "frequency": 0.5, "wet_dry": 0.9}]}
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, ".."))
+sys.path.insert(0, os.path.join(here, "..", "wah"))
+sys.path.insert(0, os.path.join(here, "..", "tone_control"))
+from wah import make_wah
+from tone_equalizer import DEFAULT_CROSSOVERS, ToneProcessor
+from audiolib import resample, wavio
+
+DEFAULT_PRESETS = os.path.join(here, "presets.json")
+
+
+class ClipProcessor:
+    """Hard clips a block in place at +/- limit (full scale is 1), then applies makeup gain."""
+
+    def __init__(self, limit=0.25, makeup=1.0):
+        self.limit = limit
+        self.makeup = np.float32(makeup)
+
+    def process(self, block):
+        np.clip(block, -self.limit, self.limit, out=block)
+        if self.makeup != 1:
+            block *= self.makeup
+        return block
+
+
+def make_stage(spec, sample_rate, channels):
+    """Builds a processor from one preset entry, e.g. {"effect": "wah", "frequency": 2}."""
+    effect = spec.get("effect")
+    if effect == "wah":
+        filter_args = {k: spec[k] for k in ("low", "high", "q") if k in spec}
+        return make_wah(sample_rate, spec.get("frequency", 1.0), spec.get("wet_dry", 0.5),
+                        spec.get("mode", "am"), **filter_args)
+    if effect == "tone":
+        crossovers = tuple(spec.get("crossovers", DEFAULT_CROSSOVERS))
+        gains = tuple(spec.get("band_gains", [1] * (len(crossovers) + 1)))
+        if len(gains) != len(crossovers) + 1:
+            raise ValueError(f"tone stage needs {len(crossovers) + 1} band_gains, got {len(gains)}")
+        return ToneProcessor(sample_rate, gains, crossovers, spec.get("order", 4), channels)
+    if effect == "clip":
+        return ClipProcessor(spec.get("limit", 0.25), spec.get("makeup", 1.0))
+    raise ValueError(f"Unknown effect: {effect!r}")
+
+
+def load_presets(filename=DEFAULT_PRESETS):
+    """Returns the {name: [stage spec, ...]} presets in a JSON file."""
+    with open(filename) as f:
+        return json.load(f)
+
+
+def run_pipeline(specs, input_file, output_file, block_size=65536, output_rate=None):
+    """Runs input_file through the stages described by specs into output_file.
+
+    Memory use is a few block-sized buffers, however long the file is.
+    With output_rate, the processed blocks are resampled to it as they
+    are written.
+    """
+    with wavio.WavReader(input_file) as src:
+        sample_rate = src.sample_rate
+        channels = src.channels
+        stages = [make_stage(spec, sample_rate, channels) for spec in specs]
+
+        buffer = np.empty((block_size, channels), dtype=np.float32)
+        converter = None
+        if output_rate and output_rate != sample_rate:
+            converter = resample.resampler(sample_rate, output_rate)
+        with wavio.WavWriter(output_file, output_rate or sample_rate, channels) as dst:
+            for block in src.blocks(block_size, out=buffer):
+                for stage in stages:
+                    block = stage.process(block)
+                if converter is not None:
+                    block = converter.process(block)
+                # The only quantization step in the chain.
+                dst.write(block)
+            if converter is not None:
+                dst.write(converter.flush())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a WAV file through a preset chain of effects.")
+    parser.add_argument("-i", "--input", help="Input WAV file")
+    parser.add_argument("-o", "--output", help="Output WAV file")
+    parser.add_argument("-p", "--preset", help="Name of the preset to apply")
+    parser.add_argument("--presets", default=DEFAULT_PRESETS, help="JSON file of presets")
+    parser.add_argument("-b", "--block-size", type=int, default=65536, help="Frames per processing block")
+    parser.add_argument("--samplerate", type=int, help="Resample the output to this rate (default: the input's)")
+    parser.add_argument("-l", "--list", action="store_true", help="List the available presets and exit")
+    args = parser.parse_args()
+
+    presets = load_presets(args.presets)
+    if args.list:
+        for name, specs in presets.items():
+            print(f"{name}: " + " -> ".join(spec["effect"] for spec in specs))
+        return
+
+    if not (args.input and args.output and args.preset):
+        parser.error("-i, -o and -p are required")
+    if args.preset not in presets:
+        parser.error(f"unknown preset {args.preset!r}, try --list")
+
+    run_pipeline(presets[args.preset], args.input, args.output, args.block_size, args.samplerate)
+    print(f"Applied {args.preset} to {args.input}, saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
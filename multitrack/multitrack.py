@@ -0,0 +1,220 @@
+"""Multitrack mixer: overlays WAV files with per-track gain and offset.
+
+    python multitrack/multitrack.py song.wav wah/mosquito.wav -o out.wav --gains 0 -12 --offsets 0 2.5
+    python multitrack/multitrack.py a.wav b.wav -o out.wav --normalize -14
+
+Every input is streamed a block at a time: read from its memory map,
+resampled on the fly if its rate differs from the output's, matched to
+the output's channel count, scaled and added into one mix buffer. Peak,
+RMS and BS.1770 loudness are metered for each track and for the mix as
+the blocks go by, so the report costs no extra pass.
+
+--normalize first runs the same pipeline without writing anything or
+metering the tracks, just to meter the mix, then mixes again with the
+gain that brings it to the target loudness. Neither pass holds more than
+a block of any input: every track is read into one shared scratch
+buffer and gained in place as it is added to the mix. Two things still
+allocate per block in both passes, because scipy gives them no output
+argument: the K-weighting filter in the mix meter (sosfilt) and, for a
+track at another rate, the resampler (upfirdn).
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from audiolib import loudness, resample, wavio
+
+
+class Track:
+    """One input WAV, delivered at the output rate and channel count.
+
+    Frames are pulled in order with add_to(); before offset seconds and
+    after the end of the file the track is silent. A negative offset
+    starts the track that far into the file instead. With metered=False the
+    track keeps no meter of its own, for when only the mix is measured.
+    """
+
+    def __init__(self, filename, sample_rate, channels, gain_db=0.0, offset=0.0, block_size=65536, metered=True):
+        self.filename = filename
+        self.reader = wavio.WavReader(filename)
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.gain = np.float32(10 ** (gain_db / 20))
+        self.block_size = block_size
+        self.silence = round(offset * sample_rate)
+        self.meter = loudness.LoudnessMeter(sample_rate, channels) if metered else None
+        self.length = max(0, self.silence + -(-self.reader.n_frames * sample_rate // self.reader.sample_rate))
+        self.skip = max(0, -self.silence)  # output frames to drop from the start
+        self.silence = max(0, self.silence)
+        self.resampler = None
+        if self.reader.sample_rate != sample_rate:
+            self.resampler = resample.resampler(self.reader.sample_rate, sample_rate)
+        self.flushed = False
+        self.read_position = 0  # next input frame to read
+        if self.resampler is None:
+            self.read_position = min(self.skip, self.reader.n_frames)
+            self.skip = 0
+        self.pending = None  # resampled output not yet added
+        self.position = 0
+
+    def add_to(self, out, scratch=None):
+        """Adds the track's next len(out) frames into out.
+
+        Input is read into scratch, a float32 array of at least len(out)
+        frames and the file's channels, which every track of a mix can
+        share; one is allocated if it is not given.
+        """
+        if scratch is None:
+            scratch = np.empty((max(len(out), self.block_size), self.reader.channels), dtype=np.float32)
+        i = min(self.silence, len(out))
+        self.silence -= i
+        while i < len(out):
+            if self.resampler is None:
+                # Read exactly what fits, straight into the scratch buffer.
+                take = min(len(out) - i, self.reader.n_frames - self.read_position)
+                if take <= 0:
+                    return
+                block = self.reader.read(self.read_position, self.read_position + take,
+                                         out=scratch[:take, :self.reader.channels])
+                self.read_position += take
+            else:
+                if self.pending is None or self.position == len(self.pending):
+                    self.pending = self._resampled(scratch)
+                    self.position = 0
+                    if self.pending is None:
+                        return
+                take = min(len(out) - i, len(self.pending) - self.position)
+                block = self.pending[self.position:self.position + take]
+                self.position += take
+            self._add(block, out[i:i + take])
+            i += take
+
+    def _resampled(self, scratch):
+        """Returns the resampler's next non-empty output block, or None at the end of the file."""
+        while not self.flushed:
+            if self.read_position < self.reader.n_frames:
+                stop = min(self.read_position + self.block_size, self.read_position + len(scratch), self.reader.n_frames)
+                block = self.reader.read(self.read_position, stop,
+                                         out=scratch[:stop - self.read_position, :self.reader.channels])
+                self.read_position = stop
+                block = self.resampler.process(block)
+            else:
+                block = self.resampler.flush()
+                self.flushed = True
+            if self.skip:
+                drop = min(self.skip, len(block))
+                block = block[drop:]
+                self.skip -= drop
+            if len(block):
+                return block
+        return None
+
+    def _add(self, block, out):
+        """Gains and meters block in place (it is scratch), then adds it into out."""
+        gain = self.gain
+        if block.shape[1] != self.channels and block.shape[1] > 1:
+            # Anything but mono is downmixed to mono first, in its first column.
+            for c in range(1, block.shape[1]):
+                block[:, :1] += block[:, c:c + 1]
+            gain = np.float32(gain / block.shape[1])
+            block = block[:, :1]
+        if gain != 1:
+            block *= gain
+        if self.meter is not None:
+            # Mono spreads to every channel.
+            self.meter.update(np.broadcast_to(block, out.shape))
+        out += block
+
+    def close(self):
+        self.reader.close()
+
+
+def mix(tracks, sample_rate, channels, writer=None, gain=1.0, block_size=65536):
+    """Mixes tracks block by block, into writer if given; returns the mix's meter.
+
+    Every track reads into one shared scratch buffer and is gained in
+    place as it is added, so the mix itself allocates nothing per block.
+    """
+    meter = loudness.LoudnessMeter(sample_rate, channels)
+    total = max(track.length for track in tracks)
+    buffer = np.empty((block_size, channels), dtype=np.float32)
+    scratch = np.empty((block_size, max(track.reader.channels for track in tracks)), dtype=np.float32)
+    gain = np.float32(gain)
+    for start in range(0, total, block_size):
+        block = buffer[:min(block_size, total - start)]
+        block.fill(0)
+        for track in tracks:
+            track.add_to(block, scratch)
+        if gain != 1:
+            block *= gain
+        meter.update(block)
+        if writer is not None:
+            writer.write(block)
+    return meter
+
+
+def open_tracks(filenames, gains, offsets, sample_rate, channels, block_size, metered=True):
+    return [Track(f, sample_rate, channels, g, o, block_size, metered) for f, g, o in zip(filenames, gains, offsets)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mix WAV files together, with loudness metering.")
+    parser.add_argument("inputs", nargs="+", help="Input WAV files")
+    parser.add_argument("-o", "--output", help="Output WAV file (leave out to only meter the mix)")
+    parser.add_argument("-g", "--gains", type=float, nargs="+", help="Gain of each input in dB (default 0)")
+    parser.add_argument("--offsets", type=float, nargs="+", help="Start time of each input in seconds (default 0); a negative one starts that far into the file")
+    parser.add_argument("-r", "--sample-rate", "--samplerate", type=int, help="Output sample rate (default: the highest input rate)")
+    parser.add_argument("-c", "--channels", type=int, help="Output channels (default: the most of any input)")
+    parser.add_argument("-n", "--normalize", type=float, metavar="LUFS", help="Scale the mix to this integrated loudness")
+    parser.add_argument("--float", action="store_true", help="Write a 32-bit float WAV, which cannot clip")
+    parser.add_argument("-b", "--block-size", type=int, default=65536, help="Frames per processing block")
+    args = parser.parse_args()
+
+    n = len(args.inputs)
+    gains = args.gains or [0.0] * n
+    offsets = args.offsets or [0.0] * n
+    if len(gains) != n or len(offsets) != n:
+        parser.error(f"--gains and --offsets need one value per input ({n})")
+
+    rates, widths = [], []
+    for filename in args.inputs:
+        with wavio.WavReader(filename) as reader:
+            rates.append(reader.sample_rate)
+            widths.append(reader.channels)
+    sample_rate = args.sample_rate or max(rates)
+    channels = args.channels or max(widths)
+
+    gain = 1.0
+    if args.normalize is not None:
+        tracks = open_tracks(args.inputs, gains, offsets, sample_rate, channels, args.block_size, metered=False)
+        measured = mix(tracks, sample_rate, channels, block_size=args.block_size).integrated
+        for track in tracks:
+            track.close()
+        if np.isfinite(measured):
+            gain = 10 ** ((args.normalize - measured) / 20)
+            print(f"Mix measured {measured:.1f} LUFS, applying {args.normalize - measured:+.1f} dB")
+
+    tracks = open_tracks(args.inputs, gains, offsets, sample_rate, channels, args.block_size)
+    try:
+        if args.output:
+            with wavio.WavWriter(args.output, sample_rate, channels, 4 if args.float else 2, args.float) as writer:
+                meter = mix(tracks, sample_rate, channels, writer, gain, args.block_size)
+        else:
+            meter = mix(tracks, sample_rate, channels, gain=gain, block_size=args.block_size)
+    finally:
+        for track in tracks:
+            track.close()
+
+    for track in tracks:
+        print(f"{track.filename}: {track.meter}")
+    print(f"mix: {meter}")
+    if meter.peak > 1 and not args.float:
+        print("Warning: the mix clips; lower the gains or use --float")
+
+
+if __name__ == "__main__":
+    main()
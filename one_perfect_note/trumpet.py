@@ -1,55 +1,76 @@
 import numpy as np
-import sounddevice as sd
 import scipy.signal as signal
 import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from audiolib import additive, envelope, realtime
 
 note_frequencies = {
     "C4": 261.63, "D4": 293.66, "E4": 329.63, "F4": 349.23,
     "G4": 392.00, "A4": 440.00, "B4": 493.88
 }
 
-def generate_trumpet_wave(frequency, duration=1.0, sampling_rate=44100):
-    t = np.linspace(0, duration, int(sampling_rate * duration), endpoint=False)
+# Fundamental plus second and third harmonics, read from one cached table
+harmonics = [0.6, 0.3, 0.2]
+
+# Static timbres cost the same however many partials they have; brass
+# opens up over the attack, so it is rendered partial by partial.
+timbres = {
+    "trumpet": additive.Timbre(harmonics),
+    "clarinet": additive.Timbre([0.75 / k if k % 2 else 0.0 for k in range(1, 16)]),
+    "organ": additive.Timbre([0.45, 0.3, 0.2, 0.2, 0.0, 0.12, 0.0, 0.1]),
+    "brass": additive.Timbre([0.6 / k for k in range(1, 13)],
+                             {k: [(0.0, 0.0), (0.02 * k, 1.0), (0.3, 0.7)] for k in range(2, 13)}),
+}
 
-    base_wave = 0.6 * np.sin(2 * np.pi * frequency * t)
-    second_harmonic = 0.3 * np.sin(2 * np.pi * 2 * frequency * t)
-    third_harmonic = 0.2 * np.sin(2 * np.pi * 3 * frequency * t)
-    trumpet_wave = base_wave + second_harmonic + third_harmonic
+attack_time = 0.05
+decay_time = 0.1
+sustain_level = 0.8
+release_time = 0.1
 
-    attack_time = 0.05
-    decay_time = 0.1
-    sustain_level = 0.8
-    release_time = 0.1
+def trumpet_envelope(n_samples, sampling_rate=44100):
+    return envelope.adsr(n_samples, int(sampling_rate * attack_time), int(sampling_rate * decay_time),
+                         sustain_level, int(sampling_rate * release_time))
 
-    envelope = np.ones_like(t)
-    attack_samples = int(sampling_rate * attack_time)
-    decay_samples = int(sampling_rate * decay_time)
-    release_samples = int(sampling_rate * release_time)
-    sustain_samples = len(t) - attack_samples - decay_samples - release_samples
+def trumpet_blocks(frequency, duration=1.0, sampling_rate=44100, block_size=4096, timbre="trumpet"):
+    """Yields the note as float32 blocks, each enveloped as it is made."""
+    n_samples = int(sampling_rate * duration)
+    shape = trumpet_envelope(n_samples, sampling_rate)
+    start = 0
+    for block in timbres[timbre].blocks(frequency, sampling_rate, block_size, n_samples):
+        yield shape.apply(block, start)
+        start += len(block)
 
-    envelope[:attack_samples] = np.linspace(0, 1, attack_samples)
-    envelope[attack_samples:attack_samples + decay_samples] = np.linspace(1, sustain_level, decay_samples)
-    envelope[attack_samples + decay_samples:attack_samples + decay_samples + sustain_samples] = sustain_level
-    envelope[-release_samples:] = np.linspace(sustain_level, 0, release_samples)
+def generate_trumpet_wave(frequency, duration=1.0, sampling_rate=44100, timbre="trumpet"):
+    n_samples = int(sampling_rate * duration)
+    return next(trumpet_blocks(frequency, duration, sampling_rate, block_size=max(n_samples, 1), timbre=timbre),
+                np.zeros(0, dtype=np.float32))
 
-    trumpet_wave *= envelope
-    return trumpet_wave
+def parse_frequency(note):
+    """Returns the frequency of a note name (e.g. A4) or a number of Hz."""
+    if note in note_frequencies:
+        return note_frequencies[note]
+    return float(note)
 
-parser = argparse.ArgumentParser(description="Play a trumpetish sound for a specified note.")
-parser.add_argument("-n", "--note", type=str, default="A4", help="Note to play (e.g., C4, D4, A4) or frequency in Hz. Default is A4.")
-parser.add_argument("-d", "--duration", type=float, default=1.0, help="Duration of the note in seconds. Default is 1 second.")
+def main():
+    parser = argparse.ArgumentParser(description="Play a trumpetish sound for a specified note.")
+    parser.add_argument("-n", "--note", type=str, default="A4", help="Note to play (e.g., C4, D4, A4) or frequency in Hz. Default is A4.")
+    parser.add_argument("-d", "--duration", type=float, default=1.0, help="Duration of the note in seconds. Default is 1 second.")
+    parser.add_argument("-t", "--timbre", choices=sorted(timbres), default="trumpet", help="Instrument timbre. Default is trumpet.")
+    parser.add_argument("-r", "--samplerate", type=int, default=44100, help="Sample rate to synthesize and play at. Default is 44100.")
 
-args = parser.parse_args()
+    args = parser.parse_args()
 
-if args.note in note_frequencies:
-    frequency = note_frequencies[args.note]
-else:
     try:
-        frequency = float(args.note)
+        frequency = parse_frequency(args.note)
     except ValueError:
         print("Invalid note or frequency. Please enter a note (eg: A4) or a frequency in Hz.")
         exit(1)
 
-trumpet_wave = generate_trumpet_wave(frequency, duration=args.duration)
-sd.play(trumpet_wave, samplerate=44100)
-sd.wait()
+    # Sound starts as soon as the first block is ready
+    realtime.play_blocks(trumpet_blocks(frequency, args.duration, args.samplerate, timbre=args.timbre), args.samplerate)
+
+if __name__ == "__main__":
+    main()
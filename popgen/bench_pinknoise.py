@@ -0,0 +1,54 @@
+# Benchmark: vectorized pink noise against the original
+# per-sample Voss-McCartney loop from `make_note`.
+#
+#     python bench_pinknoise.py [--samplerate 48000] [--bpm 90]
+
+import argparse, time
+import numpy as np
+from pinknoise import PinkNoise, pink_noise
+
+# The pink noise loop `make_note` used to run, kept here
+# verbatim as the baseline.
+def pink_noise_loop(b):
+    white_noise = np.random.uniform(-1, 1, b)
+    pink_noise = np.zeros(b)
+    octave_vals = np.zeros(int(np.log2(b)) + 1)
+    for i in range(b):
+        update_mask = (i & (i - 1)) == 0
+        if update_mask:
+            white_noise_pos = int(np.log2(i+1))
+            octave_vals[white_noise_pos] = np.random.uniform(-1, 1)
+        pink_noise[i] = np.sum(octave_vals)
+    return pink_noise / np.max(np.abs(pink_noise))
+
+# Best-of-`repeat` wall time of `f()` in seconds.
+def best_time(f, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+ap = argparse.ArgumentParser()
+ap.add_argument('--bpm', type=int, default=90)
+ap.add_argument('--samplerate', type=int, default=48_000)
+ap.add_argument('--repeat', type=int, default=3)
+args = ap.parse_args()
+
+beat_samples = int(np.round(args.samplerate / (args.bpm / 60)))
+
+print(f"{'beats':>5} {'samples':>8} {'loop (s)':>10} {'vector (s)':>11} {'speedup':>8}")
+for n in [1, 4]:
+    b = beat_samples * n
+    t_loop = best_time(lambda: pink_noise_loop(b), args.repeat)
+    t_vec = best_time(lambda: pink_noise(b), args.repeat)
+    print(f"{n:>5} {b:>8} {t_loop:>10.4f} {t_vec:>11.5f} {t_loop / t_vec:>7.0f}x")
+
+# Streaming: one minute of noise in fixed-size blocks.
+block = 1024
+nblocks = 60 * args.samplerate // block
+source = PinkNoise(seed=0)
+t_stream = best_time(lambda: [source.generate(block) for _ in range(nblocks)], 1)
+print(f"streaming 60 s in {block}-sample blocks: {t_stream:.3f} s "
+      f"({60 / t_stream:.0f}x real time)")
@@ -0,0 +1,67 @@
+# Polyphonic stereo mixer.
+#
+# Any number of voices, each a list of (onset, buffer, gain,
+# pan) note events, are added straight into one stereo output
+# buffer. A note only ever touches the samples it covers, so
+# mixing costs time proportional to the notes played, not to
+# the number of voices times the song length.
+
+import numpy as np
+
+# Per-channel gains for a pan position in [-1, 1]: -1 is hard
+# left, 0 center, 1 hard right. Center leaves both channels
+# at full gain, so a centered voice sounds just like mono.
+def pan_gains(pan):
+    if pan < -1 or pan > 1:
+        raise ValueError(f"pan out of range: {pan}")
+    return min(1, 1 - pan), min(1, 1 + pan)
+
+# Bend samples above `threshold` smoothly toward `ceiling`
+# instead of clipping them, in place, a block of
+# `block_samples` frames at a time. A block whose peak is
+# already within the ceiling has the headroom it needs and is
+# left untouched, so only a mix that would clip changes. In a
+# block that would, samples at or below the threshold are
+# untouched; above it a tanh curve with slope 1 at the
+# threshold approaches the ceiling without reaching it. The
+# threshold sits `knee_db` decibels below the ceiling.
+def soft_limit(sound, ceiling=1.0, knee_db=3.0, block_samples=65536):
+    threshold = ceiling * 10 ** (-knee_db / 20)
+    room = ceiling - threshold
+    for start in range(0, len(sound), block_samples):
+        block = sound[start:start + block_samples]
+        if not len(block) or np.abs(block).max() <= ceiling:
+            continue
+        over = np.abs(block) > threshold
+        x = block[over]
+        excess = np.abs(x) - threshold
+        block[over] = np.sign(x) * (threshold + room * np.tanh(excess / room))
+    return sound
+
+# Stereo mix bus of a fixed length in samples.
+class Mixer:
+    def __init__(self, total_samples):
+        self.sound = np.zeros((total_samples, 2))
+
+    # Add one note event. `buffer` is a mono float array and
+    # may be read-only; it is never modified.
+    def add(self, onset, buffer, gain=1.0, pan=0.0):
+        end = min(onset + len(buffer), len(self.sound))
+        if end <= onset:
+            return
+        buffer = buffer[:end - onset]
+        left, right = pan_gains(pan)
+        region = self.sound[onset:end]
+        region[:, 0] += (gain * left) * buffer
+        region[:, 1] += (gain * right) * buffer
+
+    # Add a whole voice: an iterable of (onset, buffer, gain,
+    # pan) events.
+    def add_voice(self, events):
+        for onset, buffer, gain, pan in events:
+            self.add(onset, buffer, gain, pan)
+
+    # The finished mix, soft limited in place wherever a block
+    # of `block_samples` frames would clip.
+    def output(self, ceiling=1.0, knee_db=3.0, block_samples=65536):
+        return soft_limit(self.sound, ceiling, knee_db, block_samples)
@@ -0,0 +1,62 @@
+# Memoizing note-render cache with LRU eviction.
+#
+# Rendered notes are stored read-only, so callers can mix
+# straight from the cached buffer without copying it, and
+# nobody can scribble on a note another event will reuse.
+
+from collections import OrderedDict
+
+# Memory-capped least-recently-used cache of rendered note
+# buffers. `max_bytes` bounds the total size of the cached
+# arrays; a cap of 0 disables caching entirely.
+class NoteCache:
+    def __init__(self, max_bytes=64 * 2**20):
+        self.max_bytes = max_bytes
+        self.notes = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Return the cached buffer for `key`, calling `render()`
+    # to produce it on a miss.
+    def get(self, key, render):
+        note = self.notes.get(key)
+        if note is not None:
+            self.hits += 1
+            self.notes.move_to_end(key)
+            return note
+
+        self.misses += 1
+        note = render()
+        note.flags.writeable = False
+        if note.nbytes > self.max_bytes:
+            return note
+        while self.nbytes + note.nbytes > self.max_bytes:
+            _, old = self.notes.popitem(last=False)
+            self.nbytes -= old.nbytes
+            self.evictions += 1
+        self.notes[key] = note
+        self.nbytes += note.nbytes
+        return note
+
+    def clear(self):
+        self.notes.clear()
+        self.nbytes = 0
+
+    # Counters as a dict, for reporting.
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.notes),
+            "bytes": self.nbytes,
+        }
+
+    def __str__(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0
+        return (f"note cache: {self.hits} hits, {self.misses} misses "
+                f"({rate:.0%} hit rate), {self.evictions} evictions, "
+                f"{len(self.notes)} notes in {self.nbytes / 2**20:.1f} MiB")
@@ -0,0 +1,74 @@
+# Vectorized Voss-McCartney pink noise.
+#
+# Row k of the generator holds a random value that is
+# replaced every 2**k samples, on the samples whose index has
+# exactly k trailing zero bits. Summing the rows (plus a white
+# row that changes every sample) gives a roughly 1/f
+# spectrum. Instead of walking the samples one at a time,
+# each row is built for a whole block at once by indexing its
+# list of replacement values.
+
+import numpy as np
+
+# Default number of Voss-McCartney rows. Row 15 changes every
+# 32768 samples, which puts the bottom of the pink region
+# below 2 Hz at 48 kHz.
+DEFAULT_ROWS = 16
+
+# Streaming pink noise source. Each call to `generate()`
+# continues exactly where the previous call left off, so a
+# long stream can be produced in fixed-size blocks without
+# rebuilding any state. The same `seed` always gives the
+# same stream, no matter how it is split into blocks.
+class PinkNoise:
+    def __init__(self, seed=None, rows=DEFAULT_ROWS):
+        # One independent generator per row, plus one for the
+        # white row, so the values a row draws never depend on
+        # how the stream was cut into blocks.
+        seeds = np.random.SeedSequence(seed).spawn(rows + 1)
+        self.white = np.random.default_rng(seeds[0])
+        self.row_rngs = [np.random.default_rng(s) for s in seeds[1:]]
+        self.rows = rows
+        # Absolute index of the next sample to be produced.
+        self.position = 0
+        # Current value held by each row.
+        self.values = np.array([r.uniform(-1, 1) for r in self.row_rngs])
+
+    # Return the next `n` samples as float64 in [-1, 1].
+    def generate(self, n):
+        start = self.position
+        i = np.arange(start, start + n)
+        out = self.white.uniform(-1, 1, n)
+        for k, rng in enumerate(self.row_rngs):
+            half = 1 << k
+            shift = k + 1
+            # Row k's value at sample i is its ((i + 2**k) >> (k+1))-th
+            # value. Slot 0 holds the value carried in from the
+            # sample just before this block.
+            first = (start - 1 + half) >> shift
+            last = (start + n - 1 + half) >> shift
+            fresh = np.empty(last - first + 1)
+            fresh[0] = self.values[k]
+            fresh[1:] = rng.uniform(-1, 1, last - first)
+            idx = ((i + half) >> shift) - first
+            out += fresh[idx]
+            self.values[k] = fresh[-1]
+        self.position = start + n
+        # Rows plus the white row are each bounded by 1.
+        out /= self.rows + 1
+        return out
+
+    # Yield an endless sequence of `block_size`-sample blocks.
+    def blocks(self, block_size):
+        while True:
+            yield self.generate(block_size)
+
+# Return `n` samples of pink noise normalized to a peak of 1.
+def pink_noise(n, seed=None, rows=DEFAULT_ROWS):
+    if n == 0:
+        return np.zeros(0)
+    noise = PinkNoise(seed=seed, rows=rows).generate(n)
+    peak = np.max(np.abs(noise))
+    if peak > 0:
+        noise /= peak
+    return noise
@@ -3,10 +3,23 @@
 #
 # This script puts out four bars in the "Axis Progression" chord loop,
 # with a melody and bass line.
-
-import argparse, random, re, wave
+#
+# It can also be imported: a `PopGen` holds one set of song
+# settings and renders any number of songs with them, keeping
+# its note cache warm between songs. Nothing is computed at
+# import time, and `sounddevice` is only imported to play.
+# Songs can also be streamed a block at a time, forever if
+# need be.
+
+import argparse, hashlib, os, re, shutil, sys
 import numpy as np
-import sounddevice as sd
+from mixer import Mixer
+from notecache import NoteCache
+from pinknoise import pink_noise
+from rendercache import RenderCache
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from audiolib import envelope, realtime, wavetable, wavio
 
 # 11 canonical note names.
 names = [ "C", "Db", "D", "Eb", "E", "F", "Gb", "G", "Ab", "A", "Bb", "B", ]
@@ -60,28 +73,13 @@ def parse_db(d):
         raise ValueError
     return 10**(v / 20)
 
-ap = argparse.ArgumentParser()
-ap.add_argument('--bpm', type=int, default=90)
-ap.add_argument('--samplerate', type=int, default=48_000)
-ap.add_argument('--root', type=parse_note, default="C[5]")
-ap.add_argument('--bass-octave', type=int, default=2)
-ap.add_argument('--balance', type=parse_linear_knob, default="5")
-ap.add_argument('--gain', type=parse_db, default="-3")
-ap.add_argument('--wavestyle', type=str, 
-    choices=['sine', 'square', 'triangle', 'sawtooth', 'white_noise', 'pink_noise'], 
-    default='sine')
-ap.add_argument('--output')
-ap.add_argument("--test", action="store_true", help=argparse.SUPPRESS)
-args = ap.parse_args()
-
-# Tempo in beats per minute.
-bpm = args.bpm
-
-# Audio sample rate in samples per second.
-samplerate = args.samplerate
-
-# Samples per beat.
-beat_samples = int(np.round(samplerate / (bpm / 60)))
+# Turn a seed argument into an integer seed. A plain
+# non-negative integer is used as given; any other phrase is
+# hashed, so the same phrase always makes the same song.
+def parse_seed(s):
+    if s.isdigit():
+        return int(s)
+    return int.from_bytes(hashlib.sha256(s.encode()).digest()[:8], 'little')
 
 # Relative notes of a major scale.
 major_scale = [0, 2, 4, 5, 7, 9, 11]
@@ -101,18 +99,13 @@ def chord_to_note_offset(posn):
     chord_posn = posn % 3
     return posn // 3 * 7 + major_chord[chord_posn] - 1
 
-# MIDI key where melody goes.
-melody_root = args.root
-
-# Bass MIDI key is below melody root.
-bass_root = melody_root - 12 * args.bass_octave
-
 # Root note offset for each chord in scale tones — one-based.
 chord_loop = [8, 5, 6, 4]
 
-position = 0
-def pick_notes(chord_root, n=4):
-    global position
+# Walk up or down the chord tones from `position`, choosing
+# each step with `rng`. Returns the notes and the position
+# the next chord's walk starts from.
+def pick_notes(chord_root, position, rng, n=4):
     p = position
 
     notes = []
@@ -121,66 +114,260 @@ def pick_notes(chord_root, n=4):
         chord_note = note_to_key_offset(chord_root + chord_note_offset)
         notes.append(chord_note)
 
-        if random.random() > 0.5:
+        if rng.random() > 0.5:
             p = p + 1
         else:
             p = p - 1
 
-    position = p
-    return notes
+    return notes, p
 
+# Fade a note in over its first 10% and out over its last
+# 10%, in place.
 def apply_envelope(wave):
     total_samples = len(wave)
     attack_len = int(total_samples * 0.1)  # 10% attack
     release_len = int(total_samples * 0.1)  # 10% release
-    envelope = np.ones(total_samples)
-    if attack_len > 0:
-        envelope[:attack_len] = np.linspace(0, 1, attack_len)
-    if release_len > 0:
-        envelope[-release_len:] = np.linspace(1, 0, release_len)
-    return wave * envelope
-
-# Given a MIDI key number and an optional number of beats of
-# note duration, return a sine wave for that note.
-def make_note(key, n=1, wave_style='sine'):
-    f = 440 * 2 ** ((key - 69) / 12)
-    b = beat_samples * n
-    t = np.linspace(0, 2 * np.pi * f * b / samplerate, b)
-    
-    if wave_style == 'sine':
-        wave = np.sin(t)
-    elif wave_style == 'square':
-        wave =  np.sign(np.sin(t))
-    elif wave_style == 'triangle':
-        wave =  2 * np.abs(2 * (t / (2 * np.pi) - np.floor(t / (2 * np.pi) + 0.5))) - 1
-    elif wave_style == 'sawtooth':
-        wave =  2 * (t / (2 * np.pi) - np.floor(0.5 + t / (2 * np.pi)))
-    elif wave_style == 'white_noise':
-        wave =  np.random.uniform(-1, 1, b)
-    elif wave_style == 'pink_noise':
-        # Voss-McCartney algorithm
-        white_noise = np.random.uniform(-1, 1, b)
-        pink_noise = np.zeros(b)
-        octave_vals = np.zeros(int(np.log2(b)) + 1)
-        for i in range(b):
-            update_mask = (i & (i - 1)) == 0
-            if update_mask:
-                white_noise_pos = int(np.log2(i+1))
-                octave_vals[white_noise_pos] = np.random.uniform(-1, 1)
-            pink_noise[i] = np.sum(octave_vals)
-        # Normalize
-        wave =  pink_noise / np.max(np.abs(pink_noise))
-    else:
-        raise ValueError(f"Bad wave style: {wave_style}")
-
-    return apply_envelope(wave)
+    return envelope.fade(total_samples, attack_len, release_len).apply(wave)
+
+wave_styles = ['sine', 'square', 'triangle', 'sawtooth', 'white_noise', 'pink_noise']
+
+# Noise styles are different every time, so they are never
+# cached.
+noise_styles = {'white_noise', 'pink_noise'}
+
+# Note events are scheduled ahead of time into one compact
+# record array: onset and length in samples, MIDI key, and
+# mixing gain.
+note_event = np.dtype([
+    ('onset', np.int64),
+    ('beats', np.int32),
+    ('key', np.int16),
+    ('gain', np.float32),
+    ('pan', np.float32),
+])
+
+# Turn an optional seed into a concrete one. Without a seed a
+# fresh one is drawn, so every such song is different.
+def resolve_seed(seed=None):
+    if seed is None:
+        return np.random.SeedSequence().entropy
+    return seed
+
+# Song generator for one set of settings. `root` is a MIDI
+# key, `balance` the melody share of the mix in [0, 1] and
+# `gain` a linear output gain. Caches are optional and may be
+# shared between generators: the note cache is created on
+# first use if none is given, and renders are only cached on
+# disk when a `render_cache` is given and the song is seeded.
+class PopGen:
+    def __init__(self, bpm=90, samplerate=48_000, root=72, bass_octave=2,
+                 balance=0.5, gain=10**(-3 / 20), melody_pan=0, bass_pan=0,
+                 wave_style='sine', note_cache=None, render_cache=None):
+        if wave_style not in wave_styles:
+            raise ValueError(f"Bad wave style: {wave_style}")
+        self.bpm = bpm
+        self.samplerate = samplerate
+        self.root = root
+        self.bass_octave = bass_octave
+        self.balance = balance
+        self.gain = gain
+        self.melody_pan = melody_pan
+        self.bass_pan = bass_pan
+        self.wave_style = wave_style
+        self._note_cache = note_cache
+        self.render_cache = render_cache
+
+        # Samples per beat.
+        self.beat_samples = int(np.round(samplerate / (bpm / 60)))
+
+        # MIDI key where melody goes; the bass is below it.
+        self.melody_root = root
+        self.bass_root = root - 12 * bass_octave
+
+    @property
+    def note_cache(self):
+        if self._note_cache is None:
+            self._note_cache = NoteCache()
+        return self._note_cache
+
+    # Every setting that changes the rendered file for a
+    # given seed and loop count.
+    def settings(self, seed, loops=1):
+        return {
+            'bpm': self.bpm,
+            'samplerate': self.samplerate,
+            'root': self.root,
+            'bass_octave': self.bass_octave,
+            'balance': self.balance,
+            'gain': self.gain,
+            'wavestyle': self.wave_style,
+            'loops': loops,
+            'melody_pan': self.melody_pan,
+            'bass_pan': self.bass_pan,
+            'seed': seed,
+        }
+
+    # Given a MIDI key number and an optional number of beats
+    # of note duration, return a sine wave for that note.
+    # Noise styles draw from `rng`.
+    def make_note(self, key, n=1, rng=None):
+        f = 440 * 2 ** ((key - 69) / 12)
+        b = self.beat_samples * n
+
+        if self.wave_style in wavetable.STYLES:
+            # Band-limited table lookup: sine, square,
+            # triangle and sawtooth.
+            wave = wavetable.render(self.wave_style, f, b, self.samplerate)
+            wave = wave.astype(np.float64)
+        elif self.wave_style == 'white_noise':
+            wave =  rng.uniform(-1, 1, b)
+        elif self.wave_style == 'pink_noise':
+            # Voss-McCartney algorithm, seeded from `rng`.
+            wave =  pink_noise(b, seed=int(rng.integers(2**31)))
+        else:
+            raise ValueError(f"Bad wave style: {self.wave_style}")
+
+        return apply_envelope(wave)
+
+    # Like `make_note`, but deterministic styles are served
+    # from the note cache. The returned buffer may be
+    # read-only.
+    def cached_note(self, key, n=1, rng=None):
+        if self.wave_style in noise_styles:
+            return self.make_note(key, n=n, rng=rng)
+        return self.note_cache.get(
+            (key, self.beat_samples * n, self.wave_style, self.samplerate),
+            lambda: self.make_note(key, n=n),
+        )
+
+    # Samples per chord: every note of a chord starts and
+    # ends within it.
+    @property
+    def chord_samples(self):
+        return 4 * self.beat_samples
+
+    # The note events of each chord in turn, round the chord
+    # loop forever, with onsets relative to the start of the
+    # chord. Each chord is four one-beat melody notes over one
+    # four-beat bass note. The melody is a random walk driven
+    # by `rng`, carried on from one chord to the next.
+    def chords(self, rng):
+        melody_gain = self.balance
+        bass_gain = 1 - melody_gain
+        position = 0
+        while True:
+            for c in chord_loop:
+                events = np.empty(5, dtype=note_event)
+                notes, position = pick_notes(c - 1, position, rng)
+                for i, note in enumerate(notes):
+                    events[i] = (i * self.beat_samples, 1, note + self.melody_root,
+                        melody_gain, self.melody_pan)
+                bass_note = note_to_key_offset(c - 1)
+                events[4] = (0, 4, bass_note + self.bass_root, bass_gain, self.bass_pan)
+                yield events
+
+    # Schedule `loops` passes through the chord loop as an
+    # array of note events, returning the events and the
+    # total song length in samples. Nothing is synthesized
+    # here.
+    def schedule(self, rng, loops=1):
+        n_chords = loops * len(chord_loop)
+        events = np.empty(n_chords * 5, dtype=note_event)
+        chords = self.chords(rng)
+        for i in range(n_chords):
+            chord = events[5 * i:5 * i + 5]
+            chord[:] = next(chords)
+            chord['onset'] += i * self.chord_samples
+        return events, n_chords * self.chord_samples
+
+    # Render scheduled note events by mixing each note
+    # straight into one stereo mix buffer, then soft limit
+    # any chord that would clip. Limiting chord by chord keeps
+    # `render()` and `stream()` identical. Overlapping notes
+    # from any number of voices just add. Noise styles draw
+    # from `rng`.
+    def render_events(self, events, total_samples, rng=None):
+        mixer = Mixer(total_samples)
+        for onset, beats, key, gain, pan in events:
+            note = self.cached_note(int(key), n=int(beats), rng=rng)
+            mixer.add(int(onset), note, float(gain), float(pan))
+        return mixer.output(block_samples=self.chord_samples)
+
+    # Render a whole song as a stereo float mix, before the
+    # output gain. Everything random comes from the seed: one
+    # stream picks the melody and an independent one makes
+    # noise, so changing the wave style leaves the tune alone.
+    def render(self, seed=None, loops=1):
+        seed = resolve_seed(seed)
+        melody_seed, noise_seed = np.random.SeedSequence(seed).spawn(2)
+        events, total_samples = self.schedule(np.random.default_rng(melody_seed), loops)
+        return self.render_events(events, total_samples,
+            rng=np.random.default_rng(noise_seed))
+
+    # Yield a song as float32 stereo blocks with the output
+    # gain applied, one chord's worth of notes rendered at a
+    # time, so sound can start after one chord and an endless
+    # song (`loops=None`) plays in constant memory. The blocks
+    # match `render()` sample for sample.
+    def stream(self, seed=None, loops=None, block_size=4096):
+        seed = resolve_seed(seed)
+        melody_seed, noise_seed = np.random.SeedSequence(seed).spawn(2)
+        noise_rng = np.random.default_rng(noise_seed)
+        chords = self.chords(np.random.default_rng(melody_seed))
+        n_chords = None if loops is None else loops * len(chord_loop)
+        played = 0
+        while n_chords is None or played < n_chords:
+            sound = self.render_events(next(chords), self.chord_samples, rng=noise_rng)
+            sound *= self.gain
+            for start in range(0, len(sound), block_size):
+                yield sound[start:start + block_size].astype(np.float32)
+            played += 1
+
+    # Write a rendered mix as 16-bit stereo WAV, a block at a
+    # time with the output gain applied, so no second
+    # full-length buffer is needed. The blocks go to the
+    # writer as float32, just as `stream()` yields them, so
+    # wavio quantizes a saved song and a streamed one alike.
+    def save(self, filename, sound, block_samples=65536):
+        with wavio.WavWriter(filename, self.samplerate, channels=2) as output:
+            for start in range(0, len(sound), block_samples):
+                output.write((sound[start:start + block_samples] * self.gain).astype(np.float32))
+
+    # Key of a seeded song in the render cache, or `None` if
+    # the song cannot be cached.
+    def cache_key(self, seed, loops=1):
+        if seed is None or loops is None or self.render_cache is None:
+            return None
+        return self.render_cache.key(self.settings(seed, loops))
+
+    # Write a song to `filename`, from the render cache when
+    # possible. On a miss the song is rendered once, saved,
+    # and the saved file is copied into the cache.
+    def write(self, filename, seed=None, loops=1):
+        key = self.cache_key(seed, loops)
+        cached = None if key is None else self.render_cache.lookup(key)
+        if cached is not None:
+            shutil.copyfile(cached, filename)
+            return
+        self.save(filename, self.render(seed, loops))
+        if key is not None:
+            self.render_cache.store(key,
+                lambda tmp: shutil.copyfile(filename, tmp))
+
+    # Play a song using `sounddevice` as it is rendered, or
+    # straight from the render cache when it is there. With
+    # `loops=None` the song goes on until interrupted.
+    def play(self, seed=None, loops=1, block_size=4096):
+        key = self.cache_key(seed, loops)
+        cached = None if key is None else self.render_cache.lookup(key)
+        if cached is not None:
+            with wavio.WavReader(cached) as song:
+                realtime.play_blocks(song.blocks(block_size), self.samplerate, channels=2)
+        else:
+            realtime.play_blocks(self.stream(seed, loops, block_size), self.samplerate, channels=2)
 
-# Play the given sound waveform using `sounddevice`.
-def play(sound):
-    sd.play(sound, samplerate=samplerate, blocking=True)
-        
 # Unit tests, driven by hidden `--test` argument.
-if args.test:
+def run_tests():
     note_tests = [
         (-9, -15),
         (-8, -13),
@@ -214,33 +401,64 @@ if args.test:
         c0 = chord_to_note_offset(n)
         assert c0 == c, f"{n} {c} {c0}"
 
-    exit(0)
-    
-# Stitch together a waveform for the desired music.
-sound = np.array([], dtype=np.float64)
-for c in chord_loop:
-    notes = pick_notes(c - 1)
-    melody = np.concatenate(list(make_note(i + melody_root) for i in notes))
-
-    bass_note = note_to_key_offset(c - 1)
-    bass = make_note(bass_note + bass_root, n=4)
-
-    melody_gain = args.balance
-    bass_gain = 1 - melody_gain
-
-    sound = np.append(sound, melody_gain * melody + bass_gain * bass)
-
-# Save or play the generated "music".
-if args.output:
-    output = wave.open(args.output, "wb")
-    output.setnchannels(1)
-    output.setsampwidth(2)
-    output.setframerate(samplerate)
-    output.setnframes(len(sound))
-
-    data = args.gain * 32767 * sound.clip(-1, 1)
-    output.writeframesraw(data.astype(np.int16))
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--bpm', type=int, default=90)
+    ap.add_argument('--samplerate', type=int, default=48_000)
+    ap.add_argument('--root', type=parse_note, default="C[5]")
+    ap.add_argument('--bass-octave', type=int, default=2)
+    ap.add_argument('--balance', type=parse_linear_knob, default="5")
+    ap.add_argument('--gain', type=parse_db, default="-3")
+    ap.add_argument('--melody-pan', type=float, default=0,
+        help="melody stereo position, -1 (left) to 1 (right)")
+    ap.add_argument('--bass-pan', type=float, default=0,
+        help="bass stereo position, -1 (left) to 1 (right)")
+    ap.add_argument('--wavestyle', type=str, choices=wave_styles, default='sine')
+    ap.add_argument('--loops', type=int, default=1,
+        help="number of times to play the chord loop; 0 plays forever")
+    ap.add_argument('--note-cache-mb', type=float, default=64,
+        help="memory cap for cached note renders; 0 disables")
+    ap.add_argument('--cache-stats', action='store_true',
+        help="print note cache hit/miss/eviction counts")
+    ap.add_argument('--seed', type=parse_seed,
+        help="integer or phrase that fully determines the song")
+    ap.add_argument('--render-cache',
+        default=os.path.join(os.path.expanduser('~'), '.cache', 'popgen'),
+        help="directory of cached renders for seeded songs")
+    ap.add_argument('--render-cache-mb', type=float, default=256,
+        help="disk cap for cached renders; 0 disables")
+    ap.add_argument('--output')
+    ap.add_argument("--test", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.test:
+        run_tests()
+        exit(0)
+
+    gen = PopGen(
+        bpm=args.bpm,
+        samplerate=args.samplerate,
+        root=args.root,
+        bass_octave=args.bass_octave,
+        balance=args.balance,
+        gain=args.gain,
+        melody_pan=args.melody_pan,
+        bass_pan=args.bass_pan,
+        wave_style=args.wavestyle,
+        note_cache=NoteCache(int(args.note_cache_mb * 2**20)),
+        render_cache=RenderCache(args.render_cache, int(args.render_cache_mb * 2**20)),
+    )
+
+    # Save or play the generated "music".
+    if args.output:
+        if args.loops == 0:
+            ap.error("--loops 0 plays forever, so it cannot be saved")
+        gen.write(args.output, args.seed, args.loops)
+    else:
+        gen.play(args.seed, args.loops or None)
+    if args.cache_stats:
+        print(gen.note_cache)
+        print(gen.render_cache)
 
-    output.close()
-else:
-    play(args.gain * sound)
+if __name__ == "__main__":
+    main()
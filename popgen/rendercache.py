@@ -0,0 +1,101 @@
+# On-disk cache of finished song renders.
+#
+# A song is fully determined by its settings, so the WAV made
+# for one set of settings can be handed back whenever the same
+# settings are asked for again. Entries are files named by a
+# hash of the settings; the least recently used ones are
+# deleted once the directory grows past its size cap.
+
+import hashlib, json, os, re, tempfile
+
+# Bump when a change to the generator alters its output, so
+# stale renders are never served.
+RENDER_VERSION = 3
+
+# Cache entry file names: a hex sha256 key plus ".wav". Only
+# these are ever evicted, so other files in the directory are
+# safe.
+ENTRY_NAME = re.compile(r"[0-9a-f]{64}\.wav")
+
+# Size-capped least-recently-used directory of rendered WAV
+# files. A cap of 0 disables caching entirely.
+class RenderCache:
+    def __init__(self, directory, max_bytes=256 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Hex key for a dict of settings. Every setting that
+    # affects the output must be included.
+    @staticmethod
+    def key(settings):
+        blob = json.dumps(
+            {"version": RENDER_VERSION, **settings},
+            sort_keys=True,
+        )
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".wav")
+
+    # Return the cached file for `key`, or `None` on a miss.
+    # A hit refreshes the entry's modification time, which is
+    # what eviction orders by.
+    def lookup(self, key):
+        if self.max_bytes <= 0:
+            return None
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    # Add an entry by calling `write(filename)` to create it,
+    # then evict old entries to get back under the cap.
+    # Returns the cached file, or `None` if caching is off or
+    # the render alone is bigger than the cap.
+    # The file appears atomically, so a concurrent reader
+    # never sees a half-written render.
+    def store(self, key, write):
+        if self.max_bytes <= 0:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        os.close(fd)
+        try:
+            write(tmp)
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+        path = self.path(key)
+        return path if os.path.exists(path) else None
+
+    # Delete least recently used entries until the cache
+    # fits in `max_bytes`. Files that are not cache entries
+    # are neither counted nor deleted.
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not ENTRY_NAME.fullmatch(name):
+                continue
+            st = os.stat(os.path.join(self.directory, name))
+            entries.append((st.st_mtime, st.st_size, name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            os.unlink(os.path.join(self.directory, name))
+            total -= size
+            self.evictions += 1
+
+    def __str__(self):
+        return (f"render cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.evictions} evictions in {self.directory}")
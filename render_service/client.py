@@ -0,0 +1,135 @@
+"""Client and load tester for the local render service.
+
+Sends the same job (or one per line of a job file) n times with c of them
+in flight at once, then reports per-job latency and the service's own
+metrics:
+
+    python client.py -n 50 -c 8 --job '{"job": "popgen", "loops": 2}'
+    python client.py --job '{"job": "trumpet", "note": "C4"}' -o trumpet.wav
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+
+async def request(method, path, body=b"", host="127.0.0.1", port=8765, unix=None, on_first_byte=None):
+    """Makes one HTTP request, returning (status, headers, body).
+
+    Chunked bodies are reassembled. on_first_byte is called when the
+    first byte of the body arrives.
+    """
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(head[0].split(" ", 2)[1])
+        headers = {}
+        for line in head[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        parts = []
+        if headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+                if size == 0:
+                    await reader.readuntil(b"\r\n")
+                    break
+                if not parts and on_first_byte:
+                    on_first_byte()
+                parts.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+        else:
+            data = await reader.readexactly(int(headers.get("content-length", 0)))
+            if on_first_byte:
+                on_first_byte()
+            parts.append(data)
+        return status, headers, b"".join(parts)
+    finally:
+        writer.close()
+
+
+async def render(job, **connection):
+    """Renders one job, returning (status, body, first_byte_seconds, total_seconds)."""
+    start = time.perf_counter()
+    first = []
+    status, _, body = await request("POST", "/render", json.dumps(job).encode(),
+                                    on_first_byte=lambda: first.append(time.perf_counter()), **connection)
+    end = time.perf_counter()
+    return status, body, (first[0] - start) if first else None, end - start
+
+
+async def load_test(jobs, total, concurrency, output=None, **connection):
+    """Sends total jobs, cycling through jobs, with concurrency in flight at once."""
+    results = []
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(jobs[i % len(jobs)])
+
+    async def worker():
+        while not queue.empty():
+            job = queue.get_nowait()
+            try:
+                results.append(await render(job, **connection))
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                results.append((None, str(e).encode(), None, None))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r[0] == 200]
+    rejected = sum(r[0] == 503 for r in results)
+    errors = [r for r in results if r[0] not in (200, 503)]
+    received = sum(len(r[1]) for r in ok)
+    print(f"{len(ok)} ok, {rejected} rejected (503), {len(errors)} failed in {elapsed:.2f} s: "
+          f"{len(ok) / elapsed:.2f} jobs/s, {received / elapsed / 2**20:.2f} MiB/s")
+    for name, index in (("first byte", 2), ("total", 3)):
+        values = [r[index] for r in ok]
+        if values:
+            p50, p95 = np.percentile(values, [50, 95])
+            print(f"  {name}: p50 {p50 * 1e3:.1f} ms, p95 {p95 * 1e3:.1f} ms, max {max(values) * 1e3:.1f} ms")
+    for status, body, _, _ in errors[:3]:
+        print(f"  error {status}: {body[:200].decode(errors='replace')}")
+    if output and ok:
+        with open(output, "wb") as f:
+            f.write(ok[0][1])
+        print(f"Saved the first result to {output}")
+
+    _, _, metrics = await request("GET", "/metrics", **connection)
+    print("service metrics:", json.dumps(json.loads(metrics), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send jobs to the render service and report latency.")
+    parser.add_argument("--host", default="127.0.0.1", help="Service address")
+    parser.add_argument("--port", type=int, default=8765, help="Service TCP port")
+    parser.add_argument("--unix", help="Connect to this Unix socket path instead of TCP")
+    parser.add_argument("--job", default='{"job": "popgen"}', help="Job as JSON")
+    parser.add_argument("--jobs", help="File of jobs, one JSON object per line, sent in turn")
+    parser.add_argument("-n", "--requests", type=int, default=1, help="Number of jobs to send")
+    parser.add_argument("-c", "--concurrency", type=int, default=1, help="Jobs in flight at once")
+    parser.add_argument("-o", "--output", help="Save the first rendered WAV here")
+    args = parser.parse_args()
+
+    if args.jobs:
+        with open(args.jobs) as f:
+            jobs = [json.loads(line) for line in f if line.strip()]
+    else:
+        jobs = [json.loads(args.job)]
+    asyncio.run(load_test(jobs, args.requests, args.concurrency, args.output,
+                          host=args.host, port=args.port, unix=args.unix))
+
+
+if __name__ == "__main__":
+    main()
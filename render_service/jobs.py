@@ -0,0 +1,136 @@
+"""Render and effect jobs run by the render service's worker processes.
+
+A job is a JSON object naming a handler in JOBS plus its parameters, for
+example {"job": "popgen", "seed": "rainy day", "loops": 2}. Each handler
+is a generator of WAV bytes: a header sized for the whole result, then
+16-bit sample blocks. Workers stay alive between jobs, so the tool
+modules, wavetables and note caches they load are reused by every job
+they run.
+"""
+
+import os
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, ".."))
+for tool in ("popgen", "one_perfect_note", "sin_wav_music", "wah"):
+    sys.path.insert(0, os.path.join(here, "..", tool))
+import popgen
+import sine_wave_generator
+import trumpet
+from wah import make_wah
+from audiolib import wavetable, wavio
+
+BLOCK_SIZE = 16384
+
+
+def pcm_stream(frames, sample_rate, block_size=BLOCK_SIZE):
+    """Yields a 16-bit WAV of a whole (frames,) or (frames, channels) array, a block at a time."""
+    channels = 1 if frames.ndim == 1 else frames.shape[1]
+    yield wavio.header(sample_rate, channels, len(frames))
+    for start in range(0, len(frames), block_size):
+        yield wavio.encode(frames[start:start + block_size]).tobytes()
+
+
+# One shared note cache per worker, so every popgen job it runs can reuse
+# the notes earlier jobs rendered.
+note_cache = popgen.NoteCache()
+
+
+@lru_cache(maxsize=32)
+def pop_generator(bpm, samplerate, root, bass_octave, balance, gain, wavestyle, melody_pan, bass_pan):
+    return popgen.PopGen(bpm=bpm, samplerate=samplerate, root=root, bass_octave=bass_octave,
+                         balance=balance, gain=gain, melody_pan=melody_pan, bass_pan=bass_pan,
+                         wave_style=wavestyle, note_cache=note_cache)
+
+
+def popgen_job(seed=None, loops=1, bpm=90, samplerate=48000, root="C[5]", bass_octave=2,
+               balance=5, gain=-3, wavestyle="sine", melody_pan=0, bass_pan=0):
+    """A popgen song. Settings take the same units as the popgen command line."""
+    if isinstance(seed, str):
+        seed = popgen.parse_seed(seed)
+    gen = pop_generator(int(bpm), int(samplerate), popgen.parse_note(root), int(bass_octave),
+                        popgen.parse_linear_knob(balance), popgen.parse_db(gain), wavestyle,
+                        float(melody_pan), float(bass_pan))
+    # Streamed a chord at a time, so the first bytes go out before the
+    # rest of the song is rendered.
+    loops = int(loops)
+    if loops < 0:
+        raise ValueError(f"loops must be 0 or more, got {loops}")
+    yield wavio.header(gen.samplerate, 2, loops * len(popgen.chord_loop) * gen.chord_samples)
+    for block in gen.stream(seed, loops, BLOCK_SIZE):
+        yield wavio.encode(block).tobytes()
+
+
+def trumpet_job(note="A4", duration=1.0, timbre="trumpet"):
+    """One note, by name (A4) or frequency in Hz, in one of trumpet.timbres."""
+    if timbre not in trumpet.timbres:
+        raise ValueError(f"unknown timbre {timbre!r}, expected one of {sorted(trumpet.timbres)}")
+    wave = trumpet.generate_trumpet_wave(trumpet.parse_frequency(str(note)), duration=float(duration), timbre=timbre)
+    return pcm_stream(wave, 44100)
+
+
+def sine_job(frequency=900, amplitude=32767, duration=2.0, sample_rate=44100):
+    """A sine tone, as sine_wave_generator makes it."""
+    wave = sine_wave_generator.generate_sine_wave(float(frequency), int(amplitude), float(duration), int(sample_rate))
+    return pcm_stream(wave, int(sample_rate))
+
+
+def wah_job(input, frequency=1.0, wet_dry=0.5, mode="am", **filter_args):
+    """The wah effect over a local WAV file, processed and sent a block at a time."""
+    with wavio.WavReader(input) as src:
+        wah = make_wah(src.sample_rate, float(frequency), float(wet_dry), mode,
+                       **{k: float(v) for k, v in filter_args.items()})
+        yield wavio.header(src.sample_rate, src.channels, len(src))
+        buffer = np.empty((BLOCK_SIZE, src.channels), dtype=np.float32)
+        for block in src.blocks(BLOCK_SIZE, out=buffer):
+            yield wavio.encode(wah.process(block)).tobytes()
+
+
+JOBS = {
+    "popgen": popgen_job,
+    "trumpet": trumpet_job,
+    "sine": sine_job,
+    "wah": wah_job,
+}
+
+
+def check(job):
+    """Raises ValueError unless job is a JSON object naming a known job."""
+    if not isinstance(job, dict):
+        raise ValueError("a job must be a JSON object")
+    if job.get("job") not in JOBS:
+        raise ValueError(f"unknown job {job.get('job')!r}, expected one of {sorted(JOBS)}")
+
+
+def warm_up():
+    """Process pool initializer: does the one-off setup of each job type before the first request."""
+    import scipy.signal  # noqa: F401  (the wah filter's lfilter)
+    for style in wavetable.STYLES:
+        wavetable.render(style, 440.0, 64, 48000)
+
+
+def run(job, chunks):
+    """Runs one job in a worker, putting its WAV byte chunks on the chunks queue.
+
+    The queue is bounded, so a slow client stalls the worker instead of
+    piling rendered audio up in memory. A None marks the end of the
+    stream, even when the job fails. Returns the worker's own timings.
+    """
+    started = time.time()
+    first_chunk = None
+    sent = 0
+    try:
+        params = {k: v for k, v in job.items() if k != "job"}
+        for chunk in JOBS[job["job"]](**params):
+            if first_chunk is None:
+                first_chunk = time.time()
+            chunks.put(chunk)
+            sent += len(chunk)
+    finally:
+        chunks.put(None)
+    return {"started": started, "first_chunk": first_chunk, "finished": time.time(), "bytes": sent}
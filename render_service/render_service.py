@@ -0,0 +1,253 @@
+"""Local render service: music and effects on demand over HTTP.
+
+POST a JSON job (see jobs.py) to /render and the WAV comes back as a
+chunked HTTP response, each chunk sent as soon as the worker has made it:
+
+    {"job": "popgen", "seed": "rainy day", "loops": 2, "wavestyle": "square"}
+    {"job": "trumpet", "note": "C4", "duration": 2}
+    {"job": "sine", "frequency": 900, "duration": 1}
+    {"job": "wah", "input": "/abs/path/in.wav", "frequency": 2, "mode": "filter"}
+
+GET /metrics returns job counts and latency percentiles as JSON.
+
+Jobs run on a pool of long-lived worker processes that load NumPy, SciPy
+and the tools once and keep their caches warm. Backpressure works at two
+levels. Once max_pending jobs are admitted, new ones are turned away
+with 503 and a Retry-After header instead of queueing without bound.
+Each job's chunks pass through a small bounded queue, so a slow client
+stalls its own worker rather than letting rendered audio pile up.
+
+The service only listens on localhost or a Unix socket. client.py load
+tests it.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import jobs
+
+MAX_BODY = 1 << 20
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ServiceMetrics:
+    """Job counters plus the timings of the most recent jobs.
+
+    Each job records, in seconds: queue (admitted until a worker picked it
+    up), render (the worker's run time), first_byte (request received
+    until the first audio chunk was sent) and total (until the last one).
+    """
+
+    TIMINGS = ("queue", "render", "first_byte", "total")
+
+    def __init__(self, history=1000):
+        self.started = time.time()
+        self.counts = {"accepted": 0, "completed": 0, "rejected": 0, "failed": 0, "disconnected": 0}
+        self.bytes = 0
+        self.recent = deque(maxlen=history)
+
+    def record(self, job):
+        self.recent.append(job)
+        self.bytes += job.get("bytes", 0)
+
+    def summary(self, in_flight=0):
+        summary = {"uptime": time.time() - self.started, "in_flight": in_flight,
+                   **self.counts, "bytes": self.bytes}
+        for name in self.TIMINGS:
+            values = [job[name] for job in self.recent if job.get(name) is not None]
+            if values:
+                p50, p95 = np.percentile(values, [50, 95])
+                summary[name] = {"p50": p50, "p95": p95, "max": max(values)}
+        return summary
+
+
+class RenderService:
+    """Serves jobs.JOBS from a warm process pool with bounded admission."""
+
+    def __init__(self, workers=None, max_pending=None, queue_chunks=4, verbose=False):
+        self.workers = workers or os.cpu_count()
+        self.max_pending = max_pending or 4 * self.workers
+        self.queue_chunks = queue_chunks
+        self.verbose = verbose
+        self.pending = 0
+        self.next_id = 1
+        self.metrics = ServiceMetrics()
+        # Chunk queues must be shareable with already-running workers.
+        self.manager = multiprocessing.Manager()
+        self.pool = ProcessPoolExecutor(self.workers, initializer=jobs.warm_up)
+        # Blocking queue reads, one thread per admitted job.
+        self.readers = ThreadPoolExecutor(self.max_pending)
+
+    def warm(self):
+        """Starts every worker now, so the first requests don't pay for imports."""
+        for future in [self.pool.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def close(self):
+        self.pool.shutdown()
+        self.readers.shutdown()
+        self.manager.shutdown()
+
+    async def handle(self, reader, writer):
+        received = time.time()
+        try:
+            request = await read_request(reader)
+            if request is None:
+                return
+            method, path, body = request
+            if path == "/metrics":
+                if method != "GET":
+                    return await respond(writer, 405, {"error": "use GET"})
+                return await respond(writer, 200, self.metrics.summary(self.pending))
+            if path != "/render":
+                return await respond(writer, 404, {"error": f"no such path {path}"})
+            if method != "POST":
+                return await respond(writer, 405, {"error": "use POST"})
+            if body is None:
+                return await respond(writer, 413, {"error": f"body over {MAX_BODY} bytes"})
+            try:
+                job = json.loads(body)
+                jobs.check(job)
+            except ValueError as e:
+                return await respond(writer, 400, {"error": str(e)})
+            await self.render(job, writer, received)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def render(self, job, writer, received):
+        if self.pending >= self.max_pending:
+            self.metrics.counts["rejected"] += 1
+            return await respond(writer, 503, {"error": "too many jobs, retry later"},
+                                 {"Retry-After": "1"})
+        self.pending += 1
+        self.metrics.counts["accepted"] += 1
+        record = {"id": self.next_id, "job": job["job"], "status": "failed"}
+        self.next_id += 1
+        loop = asyncio.get_running_loop()
+        chunks = self.manager.Queue(self.queue_chunks)
+        admitted = time.time()
+        future = loop.run_in_executor(self.pool, jobs.run, job, chunks)
+        streaming = False
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self.readers, chunks.get)
+                if chunk is None:
+                    break
+                if not streaming:
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: audio/wav\r\n"
+                                 b"Transfer-Encoding: chunked\r\nConnection: close\r\n"
+                                 b"X-Job-Id: %d\r\n\r\n" % record["id"])
+                    record["first_byte"] = time.time() - received
+                    streaming = True
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain()
+            timings = await future
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            record.update(status="completed", bytes=timings["bytes"],
+                          queue=timings["started"] - admitted,
+                          render=timings["finished"] - timings["started"])
+        except ConnectionError:
+            record["status"] = "disconnected"
+            # Keep emptying the queue so the worker can finish and be reused.
+            loop.run_in_executor(self.readers, drain_queue, chunks)
+        except Exception as e:
+            # A failure after the first chunk can only cut the stream
+            # short; the missing final chunk tells the client.
+            if not streaming:
+                status = 400 if isinstance(e, (TypeError, ValueError, OSError)) else 500
+                await respond(writer, status, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            self.pending -= 1
+            record["total"] = time.time() - received
+            self.metrics.counts[record["status"]] += 1
+            self.metrics.record(record)
+            if self.verbose:
+                print(json.dumps(record))
+
+
+def drain_queue(chunks):
+    while chunks.get() is not None:
+        pass
+
+
+async def read_request(reader):
+    """Returns (method, path, body) of one HTTP request, or None at end of stream.
+
+    body is None when the declared body is over MAX_BODY bytes.
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    method, path, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY:
+        return method, path, None
+    body = await reader.readexactly(length) if length else b""
+    return method, path, body
+
+
+async def respond(writer, status, payload, headers=None):
+    headers = headers or {}
+    body = json.dumps(payload).encode()
+    head = f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+    head += f"Content-Length: {len(body)}\r\nConnection: close\r\n"
+    head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    writer.write(head.encode() + b"\r\n" + body)
+    await writer.drain()
+
+
+async def serve(service, host="127.0.0.1", port=8765, unix=None):
+    if unix:
+        server = await asyncio.start_unix_server(service.handle, unix)
+        where = unix
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+        where = f"http://{host}:{port}"
+    print(f"Render service on {where} with {service.workers} workers, "
+          f"at most {service.max_pending} jobs at once.")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve popgen, trumpet, sine and wah renders over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (keep it local)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port to listen on")
+    parser.add_argument("--unix", help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument("-j", "--workers", type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--max-pending", type=int, help="Jobs admitted at once before answering 503 (default: 4 per worker)")
+    parser.add_argument("--queue-chunks", type=int, default=4, help="Rendered chunks buffered per job before its worker waits")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print each job's metrics as it finishes")
+    args = parser.parse_args()
+
+    service = RenderService(args.workers, args.max_pending, args.queue_chunks, args.verbose)
+    service.warm()
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
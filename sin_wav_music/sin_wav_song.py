@@ -1,43 +1,110 @@
-import sounddevice as sd
-import time
+import argparse
+import os
+import sys
+import numpy as np
 import sine_wave_generator as swg
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from audiolib import wavio
+
 sample_rate   = 44100
 frequency     = 440.0 # Base frequency of the sine wave (in Hz)
 amplitude     = 32767 # Max amplitude for 16-bit audio
 beat_duration = 0.50  # 120 BPM
 
-# Generate each wave segment
-clipped_waveform = swg.generate_clipped_wave(frequency, amplitude, beat_duration)
-volume_mod_waveform = swg.generate_volume_modulated_wave(frequency, amplitude, beat_duration)
-high_freq_waveform = swg.generate_high_pitch_wave(frequency, amplitude, beat_duration)
+# The original song: 4 measures of clipped, volume sweep, rest, high pitch
+DEFAULT_SONG = "C V . H x4"
+
+# One line per measure, one symbol per beat, with an optional "xN" to repeat
+# the measure N times. Blank lines and lines starting with # are ignored.
+#   C = clipped wave
+#   V = volume modulated wave
+#   H = high pitch wave
+#   . = rest
+BEAT_SYMBOLS = {
+    "C": swg.generate_clipped_wave,
+    "V": swg.generate_volume_modulated_wave,
+    "H": swg.generate_high_pitch_wave,
+    ".": None,
+}
 
 def fade_out(waveform, duration, sample_rate=44100):
     """Applies a fade-out effect to the given waveform."""
-    fade_length = int(sample_rate * duration)
+    fade_length = min(int(sample_rate * duration), len(waveform))
+    if fade_length == 0:
+        return waveform
     fade = np.linspace(1, 0, fade_length)
-    waveform[-fade_length:] *= fade
+    waveform[-fade_length:] = (waveform[-fade_length:] * fade).astype(waveform.dtype)
     return waveform
 
-# Define the rhythm pattern for each measure (4 beats)
-def play_measure():
-    # Beat 1
-    sd.play(clipped_waveform, sample_rate)
-    sd.wait()
+def parse_song(text):
+    """Parses a song into a list of (measure, repeats), where a measure is a tuple of beat symbols."""
+    song = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.split("#", 1)[0].split()
+        if not line:
+            continue
+        repeats = 1
+        if line[-1].startswith("x") and line[-1][1:].isdigit():
+            repeats = int(line.pop()[1:])
+        for symbol in line:
+            if symbol not in BEAT_SYMBOLS:
+                raise ValueError(f"line {line_number}: unknown beat {symbol!r}")
+        song.append((tuple(line), repeats))
+    return song
 
-    # Beat 2
-    sd.play(volume_mod_waveform, sample_rate)
-    sd.wait()
+def render_song(song, beat_duration=beat_duration, sample_rate=sample_rate):
+    """Renders a parsed song into one int16 buffer, every beat starting on its exact sample.
+
+    Beat i starts at round(i * sample_rate * beat_duration), so beats that
+    are not a whole number of samples long never drift: each one is cut
+    to end where the next begins. Each kind of beat is rendered only once
+    (a sample longer than any beat needs) and then copied into place, so
+    long songs cost little more than their length.
+    """
+    beat_samples = sample_rate * beat_duration
+    longest = int(np.ceil(beat_samples))
+    beats = {}
+    for symbol, generate in BEAT_SYMBOLS.items():
+        if generate is not None:
+            beats[symbol] = generate(frequency, amplitude, beat_duration + 1 / sample_rate, sample_rate=sample_rate)[:longest]
+
+    symbols = [symbol for measure, repeats in song for _ in range(repeats) for symbol in measure]
+    onsets = np.round(np.arange(len(symbols) + 1) * beat_samples).astype(int)
+    sound = np.zeros(onsets[-1], dtype=np.int16)
+    for symbol, start, stop in zip(symbols, onsets[:-1], onsets[1:]):
+        if symbol in beats:
+            sound[start:stop] = beats[symbol][:stop - start]
+    return sound
+
+def main():
+    parser = argparse.ArgumentParser(description="Render and play a song made of sine wave beats.")
+    parser.add_argument("-p", "--pattern", type=str, help="Song pattern file (see BEAT_SYMBOLS). Default: the original 4 measures")
+    parser.add_argument("-b", "--bpm", type=float, default=120, help="Tempo in beats per minute")
+    parser.add_argument("-f", "--fade", type=float, default=0.0, help="Fade out over the last this many seconds")
+    parser.add_argument("-o", "--output", type=str, help="Write the song to this WAV file instead of playing it")
+    parser.add_argument("-s", "--samplerate", type=int, default=sample_rate, help="Sample rate in Hz")
+    args = parser.parse_args()
+
+    if args.pattern:
+        with open(args.pattern) as f:
+            song = parse_song(f.read())
+    else:
+        song = parse_song(DEFAULT_SONG)
+
+    sound = render_song(song, beat_duration=60 / args.bpm, sample_rate=args.samplerate)
+    fade_out(sound, args.fade, args.samplerate)
 
-    # Beat 3
-    time.sleep(beat_duration)
+    if args.output:
+        wavio.write(args.output, sound, args.samplerate)
+        print(f"Saved song to {args.output}!")
+        return
 
-    # Beat 4
-    sd.play(high_freq_waveform, sample_rate)
+    import sounddevice as sd
+    print("My beatiful song...\n")
+    sd.play(sound, args.samplerate)
     sd.wait()
+    print("Thank you for listening.")
 
-# Play the rhythm pattern a few times
-print("My beatiful song...\n")
-for _ in range(4):  # Play 4 measures
-    play_measure()
-print("Thank you for listening.")
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,33 @@
 import numpy as np
 import argparse
-import wave
+import os
+import re
+import shlex
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from audiolib import realtime, wavetable, wavio
 
 def generate_sine_wave(frequency, amplitude, duration, sample_rate=44100):
     """Generates a sine wave at a given frequency, amplitude, and duration."""
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    waveform = amplitude * np.sin(2 * np.pi * frequency * t)
+    waveform = wavetable.render("sine", frequency, int(sample_rate * duration), sample_rate)
+    waveform *= amplitude
     return waveform.astype(np.int16)
 
+def sine_wave_blocks(frequency, amplitude, duration=None, sample_rate=44100, block_size=4096):
+    """Yields a sine wave as float32 blocks (full scale 1), forever if duration is None.
+
+    The phase carries across blocks, so the result is one continuous tone
+    and only one block is ever in memory.
+    """
+    n_samples = None if duration is None else int(sample_rate * duration)
+    osc = wavetable.oscillator("sine", frequency, sample_rate)
+    scale = np.float32(amplitude / 32767)
+    for block in osc.blocks(block_size, n_samples):
+        block *= scale
+        yield block
+
 def generate_clipped_wave(frequency, amplitude, duration, clip_limit=8192, sample_rate=44100):
     """Generates a sine wave with clipping applied."""
     waveform = generate_sine_wave(frequency, amplitude, duration, sample_rate)
@@ -15,36 +35,130 @@ def generate_clipped_wave(frequency, amplitude, duration, clip_limit=8192, sampl
 
 def generate_volume_modulated_wave(frequency, amplitude, duration, sample_rate=44100):
     """Generates a sine wave with volume modulation applied."""
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    volume_sweep = 0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * t)  # Sweeps from 50% to 100%
-    waveform = amplitude * volume_sweep * np.sin(2 * np.pi * frequency * t)
+    n_samples = int(sample_rate * duration)
+    volume_sweep = 0.5 + 0.5 * wavetable.render("sine", 0.5, n_samples, sample_rate)  # Sweeps from 50% to 100%
+    waveform = amplitude * volume_sweep * wavetable.render("sine", frequency, n_samples, sample_rate)
     return waveform.astype(np.int16)
 
 def generate_high_pitch_wave(frequency, amplitude, duration, sample_rate=44100):
     """Generates a high-pitched sine wave at 1.5x the base frequency."""
     return generate_sine_wave(frequency * 1.5, amplitude, duration, sample_rate)
 
+def generate_sine_waves(frequencies, amplitudes, duration, sample_rate=44100):
+    """Generates many same-length sine waves, one row per tone.
 
-def main():
-    # Set up argument parsing
+    The bank is rendered a slice of samples at a time straight into the
+    int16 result, so no full-size float temporaries are ever built.
+    """
+    n_samples = int(sample_rate * duration)
+    amplitudes = np.asarray(amplitudes, dtype=np.float32)[:, None]
+    waveforms = np.empty((len(frequencies), n_samples), dtype=np.int16)
+    for start, block in wavetable.bank_blocks("sine", frequencies, n_samples, sample_rate):
+        block *= amplitudes
+        waveforms[:, start:start + block.shape[1]] = block
+    return waveforms
+
+
+def build_parser():
+    """Returns the argument parser, shared by the command line and tone preset files."""
     parser = argparse.ArgumentParser(description="Generate a mosquito noise sine wave.")
     parser.add_argument("-f", "--frequency", type=float, default=900, help="Frequency of the sine wave in Hz")
     parser.add_argument("-a", "--amplitude", type=int, default=32767, help="Amplitude of the sine wave")
     parser.add_argument("-d", "--duration", type=float, default=2.0, help="Duration of the sine wave in seconds")
-    parser.add_argument("-s", "--sample_rate", type=int, default=44100, help="Sample rate in Hz")
-    parser.add_argument("-o", "--output", type=str, default="sine.wav", help="Output filename")
+    parser.add_argument("-s", "--sample_rate", "--samplerate", type=int, default=44100, help="Sample rate in Hz")
+    parser.add_argument("-o", "--output", type=str, help="Output filename (default sine.wav, or the preset name in --batch)")
+    return parser
+
+
+def parse_presets(text, parser=None):
+    """Parses a saved_tones.txt-style preset file into a list of (name, args).
+
+    Presets are separated by blank lines. The first line of each is its
+    name, and the rest are command line arguments for this script.
+    """
+    if parser is None:
+        parser = build_parser()
+    presets = []
+    for block in re.split(r"\n\s*\n", text):
+        lines = [line.strip() for line in block.strip().splitlines() if line.strip()]
+        if not lines:
+            continue
+        name = lines.pop(0) if not lines[0].startswith("-") else f"tone{len(presets) + 1}"
+        args = parser.parse_args(shlex.split(" ".join(lines)))
+        if args.output is None:
+            args.output = re.sub(r"\W+", "_", name).strip("_") + ".wav"
+        presets.append((name, args))
+    return presets
+
+
+def render_presets(presets, output_dir=".", workers=None, batch=32):
+    """Renders every preset in one process and writes them in parallel.
+
+    Presets with the same sample rate and length are generated together,
+    up to batch of them per vectorized call. Each batch is queued for
+    writing only once the previous one is on disk, so memory stays at
+    about two batches of output however many presets there are.
+    """
+    groups = {}
+    for name, args in presets:
+        key = (args.sample_rate, int(args.sample_rate * args.duration))
+        groups.setdefault(key, []).append(args)
+
+    os.makedirs(output_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        writes = []
+        for (sample_rate, _), group in groups.items():
+            for i in range(0, len(group), batch):
+                part = group[i:i + batch]
+                waveforms = generate_sine_waves(
+                    [args.frequency for args in part],
+                    [args.amplitude for args in part],
+                    part[0].duration,
+                    sample_rate,
+                )
+                # The previous batch finishes writing before this one is queued.
+                for write in writes:
+                    write.result()
+                writes = []
+                for args, waveform in zip(part, waveforms):
+                    path = os.path.join(output_dir, args.output)
+                    writes.append(pool.submit(wavio.write, path, waveform, sample_rate))
+        for write in writes:
+            write.result()
+    return len(presets)
+
+
+def main():
+    # Set up argument parsing
+    parser = build_parser()
+    parser.add_argument("--batch", type=str, help="Render every tone in a preset file (like saved_tones.txt)")
+    parser.add_argument("--output_dir", type=str, default=".", help="Where --batch writes its files")
+    parser.add_argument("-j", "--workers", type=int, help="Parallel file writers for --batch")
+    parser.add_argument("--play", action="store_true", help="Play the tone as it is generated instead of saving it; -d 0 plays until Ctrl-C")
 
     args = parser.parse_args()
 
+    if args.batch:
+        with open(args.batch) as f:
+            presets = parse_presets(f.read())
+        count = render_presets(presets, args.output_dir, args.workers)
+        print(f"Saved {count} tones to {args.output_dir}!")
+        return
+
+    if args.play:
+        duration = args.duration if args.duration > 0 else None
+        blocks = sine_wave_blocks(args.frequency, args.amplitude, duration, args.sample_rate)
+        realtime.play_blocks(blocks, args.sample_rate)
+        return
+
+    if args.output is None:
+        args.output = "sine.wav"
+
     # Generate the wave
     waveform = generate_sine_wave(args.frequency, args.amplitude, args.duration, args.sample_rate)
 
     # Save to a .wav file
-    with wave.open(args.output, 'w') as wav_file:
-        wav_file.setnchannels(1)  # Mono sound
-        wav_file.setsampwidth(2)  # 16 bits per sample
-        wav_file.setframerate(args.sample_rate)
-        wav_file.writeframes(waveform.tobytes())
+    wavio.write(args.output, waveform, args.sample_rate)  # Mono, 16 bits per sample
     print(f"Saved sine wave to {args.output}!")
 
 if __name__ == "__main__":
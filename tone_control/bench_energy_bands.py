@@ -0,0 +1,73 @@
+"""Benchmark: fft_energy_bands (rfft) and sampled_energy_bands against the original complex FFT.
+
+    python bench_energy_bands.py [--seconds 10 60 300]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+import tone_equalizer as te
+
+
+def fft_energy_bands_complex(waveform, sample_rate):
+	"""The original full complex FFT and boolean mask version, kept as the baseline."""
+	spectrum = np.fft.fft(waveform)
+	freqs = np.fft.fftfreq(len(spectrum), 1 / sample_rate)
+
+	low_band = (0, 300)
+	mid_band = (300, 2000)
+	high_band = (2000, sample_rate // 2)
+
+	low_energy = np.sum(np.abs(spectrum[(freqs >= low_band[0]) & (freqs < low_band[1])])**2)
+	mid_energy = np.sum(np.abs(spectrum[(freqs >= mid_band[0]) & (freqs < mid_band[1])])**2)
+	high_energy = np.sum(np.abs(spectrum[(freqs >= high_band[0]) & (freqs < high_band[1])])**2)
+
+	return low_energy, mid_energy, high_energy
+
+
+def measure(f, repeat):
+	"""Returns (best wall time in seconds, peak traced memory in bytes) of f()."""
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		f()
+		best = min(best, time.perf_counter() - start)
+	tracemalloc.start()
+	f()
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return best, peak
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark band energy analysis in the tone equalizer.")
+	parser.add_argument("--sample_rate", type=int, default=44100)
+	parser.add_argument("--seconds", type=float, nargs="+", default=[10, 60, 300])
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+
+	sr = args.sample_rate
+	rng = np.random.default_rng(0)
+	methods = [
+		("complex fft", lambda x: fft_energy_bands_complex(x, sr)),
+		("rfft", lambda x: te.fft_energy_bands(x, sr)),
+		("sampled", lambda x: te.sampled_energy_bands(x, sr)),
+	]
+
+	print(f"{'seconds':>8} {'method':<12} {'time (s)':>9} {'peak MiB':>9} {'vs complex':>10}")
+	for seconds in args.seconds:
+		# Odd length, so the real FFT has to pad to a fast size.
+		x = rng.standard_normal(int(seconds * sr) | 1)
+		baseline = None
+		for name, f in methods:
+			t, peak = measure(lambda: f(x), args.repeat)
+			if baseline is None:
+				baseline = t
+			print(f"{seconds:>8g} {name:<12} {t:>9.4f} {peak / 2**20:>9.1f} {baseline / t:>9.1f}x")
+
+
+if __name__ == "__main__":
+	main()
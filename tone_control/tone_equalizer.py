@@ -1,90 +1,388 @@
 import numpy as np
 import argparse
-from scipy.io import wavfile
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from scipy.fft import next_fast_len, rfft
 from scipy.signal import butter, sosfilt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from audiolib import realtime, resample, wavio
 
-def fft_energy_bands(waveform, sample_rate):
-	"""Calculates the energy in low, mid, and high frequency bands of the waveform."""
-	# Perform fast fourier transform on the waveform
-	spectrum = np.fft.fft(waveform)
-	freqs = np.fft.fftfreq(len(spectrum), 1 / sample_rate)
 
-	# frequency band ranges in Hz
-	low_band = (0, 300)
-	mid_band = (300, 2000)
-	high_band = (2000, sample_rate // 2)
+# Default crossover frequencies in Hz: low/mid at 300, mid/high at 2000.
+DEFAULT_CROSSOVERS = (300, 2000)
 
-	# Calculate energy in each band
-	low_energy = np.sum(np.abs(spectrum[(freqs >= low_band[0]) & (freqs < low_band[1])])**2)
-	mid_energy = np.sum(np.abs(spectrum[(freqs >= mid_band[0]) & (freqs < mid_band[1])])**2)
-	high_energy = np.sum(np.abs(spectrum[(freqs >= high_band[0]) & (freqs < high_band[1])])**2)
 
-	return low_energy, mid_energy, high_energy
+def band_ranges(sample_rate, crossovers=DEFAULT_CROSSOVERS):
+	"""Returns the (low, high) frequency range in Hz of each band the crossovers split the spectrum into."""
+	edges = [0, *crossovers, sample_rate // 2]
+	return list(zip(edges[:-1], edges[1:]))
 
-def calculate_gains(low_energy = 1, mid_energy = 1, high_energy = 1):
+
+def band_bins(bands, n_fft, sample_rate):
+	"""Converts (low, high) Hz band ranges to [start, stop) index ranges into an rfft of length n_fft."""
+	edges = np.ceil(np.array(bands, dtype=float) * n_fft / sample_rate).astype(int)
+	return np.clip(edges, 0, n_fft // 2 + 1)
+
+
+def band_energies(power, bins):
+	"""Sums a power spectrum over each [start, stop) bin range."""
+	return tuple(np.sum(power[start:stop]) for start, stop in bins)
+
+
+def power_spectrum(spectrum):
+	"""Returns |spectrum|**2 without the extra temporaries of np.abs(spectrum)**2."""
+	power = spectrum.real * spectrum.real
+	power += spectrum.imag * spectrum.imag
+	return power
+
+
+def fft_energy_bands(waveform, sample_rate, crossovers=DEFAULT_CROSSOVERS, bands=None):
+	"""Calculates the energy in each frequency band of the waveform (low, mid, and high by default).
+
+	bands, if given, is any list of (low, high) ranges in Hz and overrides
+	crossovers. The real FFT is taken at the next fast length, and energies
+	are rescaled to what an unpadded FFT would report.
+	"""
+	if bands is None:
+		bands = band_ranges(sample_rate, crossovers)
+	n = len(waveform)
+	n_fft = next_fast_len(n, real=True)
+
+	# Perform real fast fourier transform on the waveform: only the
+	# non-negative frequencies, which are the only ones the bands use
+	spectrum = rfft(waveform, n=n_fft, workers=-1)
+	power = power_spectrum(spectrum)
+	del spectrum
+
+	energies = band_energies(power, band_bins(bands, n_fft, sample_rate))
+	return tuple(energy * n / n_fft for energy in energies)
+
+
+def sampled_energy_bands(waveform, sample_rate, crossovers=DEFAULT_CROSSOVERS, bands=None, segment_size=8192, segments=64):
+	"""Estimates band energies from a fixed number of evenly spaced Hann-windowed segments.
+
+	Cost does not grow with the length of the waveform, at the price of only
+	looking at part of it. Only the ratios between bands are meaningful.
+	"""
+	if bands is None:
+		bands = band_ranges(sample_rate, crossovers)
+	if len(waveform) <= segment_size * segments:
+		return fft_energy_bands(waveform, sample_rate, bands=bands)
+
+	starts = np.linspace(0, len(waveform) - segment_size, segments).astype(int)
+	frames = np.stack([waveform[start:start + segment_size] for start in starts]).astype(np.float64)
+	frames *= np.hanning(segment_size)
+	power = power_spectrum(rfft(frames, axis=1, workers=-1)).sum(axis=0)
+	return band_energies(power, band_bins(bands, segment_size, sample_rate))
+
+def calculate_gains(*energies):
 	"""Calculates the gain needed for each band to equalize their energies."""
-	target_energy = (low_energy + mid_energy + high_energy) / 3
-	low_gain  = np.sqrt(target_energy / low_energy) if low_energy > 0 else 1
-	mid_gain  = np.sqrt(target_energy / mid_energy) if mid_energy > 0 else 1
-	high_gain = np.sqrt(target_energy / high_energy) if high_energy > 0 else 1
+	if not energies:
+		energies = (1, 1, 1)
+	target_energy = sum(energies) / len(energies)
+	return tuple(np.sqrt(target_energy / energy) if energy > 0 else 1 for energy in energies)
+
+
+@lru_cache(maxsize=None)
+def design_band_filters(sample_rate, crossovers=DEFAULT_CROSSOVERS, order=4):
+	"""Designs (once per sample rate, crossovers and order) the SOS filter for each band.
+
+	The first band is a low-pass, the last a high-pass, and everything in
+	between is a band-pass between neighbouring crossovers. The arrays are
+	shared by every caller, so don't modify them.
+	"""
+	sections = [butter(order, crossovers[0], btype='low', fs=sample_rate, output='sos')]
+	for lo, hi in zip(crossovers[:-1], crossovers[1:]):
+		sections.append(butter(order, [lo, hi], btype='bandpass', fs=sample_rate, output='sos'))
+	sections.append(butter(order, crossovers[-1], btype='high', fs=sample_rate, output='sos'))
+	return tuple(sections)
+
+
+# sosfilt releases the GIL, so bands can be filtered on threads.
+_band_pool = None
+
+def band_pool():
+	global _band_pool
+	if _band_pool is None:
+		_band_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+	return _band_pool
+
+
+class ToneFilterBank:
+	"""Splits a signal into bands with cached filter designs and mixes them back with per-band gains.
+
+	Bands with zero gain are never filtered, and the rest run side by side on
+	a thread pool, so an N-band EQ takes about as long as a single sosfilt
+	pass over the signal.
+	"""
+
+	def __init__(self, sample_rate, crossovers=DEFAULT_CROSSOVERS, order=4):
+		self.sample_rate = sample_rate
+		self.crossovers = tuple(crossovers)
+		self.sections = design_band_filters(sample_rate, self.crossovers, order)
+
+	def __len__(self):
+		return len(self.sections)
+
+	def initial_states(self, channels=None):
+		"""Returns per-band sosfilt states at rest, for use with apply(states=...).
+
+		Pass channels when the waveforms will be shaped (channels, samples).
+		"""
+		shape = (2,) if channels is None else (channels, 2)
+		return [np.zeros((sos.shape[0], *shape)) for sos in self.sections]
+
+	def apply(self, waveform, gains, states=None):
+		"""Returns the sum of each band of waveform times its gain, as float64.
+
+		Filtering runs along the last axis of waveform.
+
+		If states is given (see initial_states), each band's filter state is
+		read from and written back to it, so consecutive blocks of a stream
+		filter exactly like the whole signal would.
+		"""
+		if len(gains) != len(self.sections):
+			raise ValueError(f"Expected {len(self.sections)} band gains, got {len(gains)}")
+		active = [i for i, gain in enumerate(gains) if gain]
+
+		def filter_band(i):
+			if states is None:
+				band = sosfilt(self.sections[i], waveform)
+			else:
+				band, states[i] = sosfilt(self.sections[i], waveform, zi=states[i])
+			band *= gains[i]
+			return band
+
+		if len(active) > 1 and (os.cpu_count() or 1) > 1:
+			bands = band_pool().map(filter_band, active)
+		else:
+			bands = map(filter_band, active)
+
+		out = None
+		for band in bands:
+			if out is None:
+				out = band
+			else:
+				out += band
+		if out is None:
+			out = np.zeros(np.shape(waveform))
+		return out
 
-	return low_gain, mid_gain, high_gain
 
 def apply_tone_filter(waveform, sample_rate, low_gain, mid_gain, high_gain):
 	"""Applies low, mid, and high tone filters with specified gains to equalize band energy."""
+	equalized_waveform = ToneFilterBank(sample_rate).apply(waveform, (low_gain, mid_gain, high_gain))
+	return equalized_waveform.astype(np.int16)
+
 
-	# Create bandpass filters for each band
-	sos_low = butter(4, 300, btype='low', fs=sample_rate, output='sos')
-	sos_mid = butter(4, [300, 2000], btype='bandpass', fs=sample_rate, output='sos')
-	sos_high = butter(4, 2000, btype='high', fs=sample_rate, output='sos')
+def equalize_bands(waveform, sample_rate, bank=None, keep_gains=None, analysis="full"):
+	"""Balances the band energies of waveform in a single filter pass.
 
-	# Apply each filter and adjust gain
-	low_band = low_gain * sosfilt(sos_low, waveform)
-	mid_band = mid_gain * sosfilt(sos_mid, waveform)
-	high_band = high_gain * sosfilt(sos_high, waveform)
+	keep_gains, if given, multiply the equalizing gains band by band, so
+	dropping a band does not need a second trip through the filters.
+	analysis picks the energy estimate: "full" (fft_energy_bands) or
+	"sampled" (sampled_energy_bands). The result has waveform's type:
+	int16 samples stay int16, and float ones stay float.
+	"""
+	if bank is None:
+		bank = ToneFilterBank(sample_rate)
 
-	# Combine bands to get the equalized waveform
-	equalized_waveform = low_band + mid_band + high_band
+	if analysis == "sampled":
+		energies = sampled_energy_bands(waveform, sample_rate, bank.crossovers)
+	else:
+		energies = fft_energy_bands(waveform, sample_rate, bank.crossovers)
+
+	gains = calculate_gains(*energies)
+	if keep_gains is not None:
+		gains = tuple(g * k for g, k in zip(gains, keep_gains))
+
+	equalized_waveform = bank.apply(waveform, gains)
+
+	if np.issubdtype(waveform.dtype, np.floating):
+		return equalized_waveform.astype(waveform.dtype)
 	return equalized_waveform.astype(np.int16)
 
 
-def equalize_bands(waveform, sample_rate):
-	low_energy, mid_energy, high_energy = fft_energy_bands(waveform, sample_rate)
+def read_blocks(filename, block_size):
+	"""Yields the first channel of a WAV file as float32 blocks of up to block_size samples, scaled to [-1, 1)."""
+	with wavio.WavReader(filename) as wav_file:
+		yield from wav_file.blocks(block_size, channels=0)
+
+
+class WelchEnergyBands:
+	"""Accumulates band energies block by block with a Welch estimate.
+
+	Blocks are cut into Hann-windowed, half-overlapping segments; leftover
+	samples are carried into the next block, so the estimate does not depend
+	on the block size. Only the ratios between the bands are meaningful,
+	which is all calculate_gains needs.
+	"""
+
+	def __init__(self, sample_rate, crossovers=DEFAULT_CROSSOVERS, segment_size=4096):
+		self.segment_size = segment_size
+		self.hop = segment_size // 2
+		self.window = np.hanning(segment_size)
+		self.power = np.zeros(segment_size // 2 + 1)
+		self.segments = 0
+		self.carry = np.zeros(0)
+
+		self.bins = band_bins(band_ranges(sample_rate, crossovers), segment_size, sample_rate)
+
+	def add(self, block):
+		data = np.concatenate((self.carry, block))
+		n_segments = max(0, (len(data) - self.segment_size) // self.hop + 1)
+		if n_segments:
+			starts = np.arange(n_segments) * self.hop
+			frames = data[starts[:, None] + np.arange(self.segment_size)]
+			frames *= self.window
+			self.power += power_spectrum(rfft(frames, axis=1)).sum(axis=0)
+			self.segments += n_segments
+		self.carry = data[n_segments * self.hop:]
+
+	def energies(self):
+		"""Returns each band's mean energy per segment."""
+		power = self.power
+		segments = self.segments
+		if segments == 0:
+			# Shorter than one segment: fall back to a single zero-padded one.
+			frame = np.zeros(self.segment_size)
+			frame[:len(self.carry)] = self.carry
+			power = power_spectrum(rfft(frame * self.window))
+			segments = 1
+		return tuple(energy / segments for energy in band_energies(power, self.bins))
+
+
+def stream_tone_control(input_file, output_file, gains, equalize=False, block_size=65536,
+		crossovers=DEFAULT_CROSSOVERS, order=4, output_rate=None):
+	"""Filters input_file into output_file a block at a time, so memory use does not grow with file length.
 
-	low_gain, mid_gain, high_gain = calculate_gains(low_energy, mid_energy, high_energy)
+	If equalize is set, a first read-only pass measures band energies and the
+	equalizing gains are folded into gains. If output_rate is set, the
+	filtered blocks are resampled to it on their way out.
+	"""
+	with wavio.WavReader(input_file) as wav_file:
+		sample_rate = wav_file.sample_rate
+	bank = ToneFilterBank(sample_rate, crossovers, order)
 
-	equalized_waveform = apply_tone_filter(waveform, sample_rate, low_gain, mid_gain, high_gain)
+	if equalize:
+		bands = WelchEnergyBands(sample_rate, bank.crossovers)
+		for block in read_blocks(input_file, block_size):
+			bands.add(block)
+		gains = tuple(g * k for g, k in zip(calculate_gains(*bands.energies()), gains))
+	states = bank.initial_states()
 
-	return equalized_waveform
+	blocks = (bank.apply(block, gains, states) for block in read_blocks(input_file, block_size))
+	if output_rate and output_rate != sample_rate:
+		blocks = resample.resampler(sample_rate, output_rate).blocks(blocks)
+	with wavio.WavWriter(output_file, output_rate or sample_rate) as out:
+		for block in blocks:
+			out.write(block)
+
+
+class ToneProcessor:
+	"""Tone filter for audio arriving in (frames, channels) float32 blocks, for the realtime engine.
+
+	Band filter states carry over between blocks, per channel.
+	"""
+
+	def __init__(self, sample_rate, gains, crossovers=DEFAULT_CROSSOVERS, order=4, channels=1):
+		self.bank = ToneFilterBank(sample_rate, crossovers, order)
+		self.gains = gains
+		self.states = self.bank.initial_states(channels)
+
+	def process(self, block):
+		block[:] = self.bank.apply(block.T, self.gains, self.states).T
+		return block
 
 
 def main():
 	parser = argparse.ArgumentParser(description="Process and equalize the frequency bands of a WAV file.")
-	parser.add_argument("wavfile", type=str, help="Path to the input WAV file")
+	parser.add_argument("wavfile", type=str, nargs="?", help="Path to the input WAV file")
 	parser.add_argument("--equalize", action="store_true", help="Apply equalization to balance band energies.")
 	parser.add_argument("--drop_low", action="store_true", help="Drop the low frequency band.")
 	parser.add_argument("--drop_mid", action="store_true", help="Drop the mid frequency band.")
 	parser.add_argument("--drop_high", action="store_true", help="Drop the high frequency band.")
+	parser.add_argument("--crossovers", type=float, nargs="+", default=list(DEFAULT_CROSSOVERS),
+		help="Band crossover frequencies in Hz, ascending. N crossovers make N+1 bands.")
+	parser.add_argument("--order", type=int, default=4, help="Butterworth order of each band filter.")
+	parser.add_argument("--analysis", choices=["full", "sampled"], default="full",
+		help="Band energy estimate for --equalize: whole-file FFT or a fixed number of sampled windows.")
+	parser.add_argument("--band_gains", type=float, nargs="+", help="Gain for every band, low to high. Overrides the --drop flags.")
+	parser.add_argument("--stream", action="store_true", help="Process the file block by block with bounded memory (needs --output).")
+	parser.add_argument("--block_size", type=int, default=65536, help="Samples per block in streaming mode.")
+	parser.add_argument("-o", "--output", type=str, help="Write the result to this WAV file instead of playing it.")
+	parser.add_argument("--samplerate", type=int, help="Resample the result to this rate (default: the input's).")
+	parser.add_argument("--live", action="store_true", help="Filter live audio from the input device to the output device.")
+	parser.add_argument("--simulate", action="store_true", help="Run the live block engine over wavfile into --output and report callback timing.")
+	parser.add_argument("--paced", action="store_true", help="With --simulate, wait for each block's real-time deadline.")
+	parser.add_argument("--live_block_size", type=int, default=256, help="Block size in frames for --live and --simulate.")
+	parser.add_argument("--live_sample_rate", type=int, default=48000, help="Sample rate for --live.")
+	parser.add_argument("--live_channels", type=int, default=1, help="Channel count for --live.")
 	args = parser.parse_args()
 
-	sample_rate, waveform = wavfile.read(args.wavfile)
+	crossovers = tuple(args.crossovers)
+	if list(crossovers) != sorted(set(crossovers)):
+		parser.error("--crossovers must be strictly ascending")
+	n_bands = len(crossovers) + 1
+
+	if args.band_gains is not None:
+		if len(args.band_gains) != n_bands:
+			parser.error(f"--band_gains needs {n_bands} values")
+		gains = tuple(args.band_gains)
+	else:
+		# Low is the first band, high the last, and mid everything between.
+		gains = (int(not args.drop_low),) + (int(not args.drop_mid),) * (n_bands - 2) + (int(not args.drop_high),)
+
+	if args.live:
+		processor = ToneProcessor(args.live_sample_rate, gains, crossovers, args.order, args.live_channels)
+		engine = realtime.BlockEngine([processor], args.live_sample_rate, args.live_block_size, args.live_channels)
+		print(realtime.run_live(engine))
+		return
+
+	if args.wavfile is None:
+		parser.error("wavfile is required unless --live is given")
 
-	# If stereo, take just one channel
-	if len(waveform.shape) > 1:
-		waveform = waveform[:, 0]
+	if args.simulate:
+		if not args.output:
+			parser.error("--simulate needs --output")
+		with wavio.WavReader(args.wavfile) as wav_file:
+			sample_rate = wav_file.sample_rate
+			n_channels = wav_file.channels
+		processor = ToneProcessor(sample_rate, gains, crossovers, args.order, n_channels)
+		engine = realtime.BlockEngine([processor], sample_rate, args.live_block_size, n_channels)
+		print(realtime.run_simulated(engine, args.wavfile, args.output, paced=args.paced))
+		return
+
+	if args.stream:
+		if not args.output:
+			parser.error("--stream needs --output")
+		stream_tone_control(args.wavfile, args.output, gains, args.equalize, args.block_size, crossovers, args.order,
+			args.samplerate)
+		return
+
+	# Just the first channel, as float32 in [-1, 1) whatever the file's
+	# sample format; wavio.write quantizes the result, as in --stream
+	with wavio.WavReader(args.wavfile) as wav_file:
+		sample_rate = wav_file.sample_rate
+		waveform = wav_file.read(channels=0)
 	
+	bank = ToneFilterBank(sample_rate, crossovers, args.order)
 	if args.equalize:
-		waveform = equalize_bands(waveform, sample_rate)
-	
-	waveform = apply_tone_filter(
-		waveform, 
-		sample_rate, 
-		low_gain  = int(not args.drop_low), 
-		mid_gain  = int(not args.drop_mid), 
-		high_gain = int(not args.drop_high)
-	)
-	
+		waveform = equalize_bands(waveform, sample_rate, bank, keep_gains=gains, analysis=args.analysis)
+	else:
+		waveform = bank.apply(waveform, gains)
+
+	if args.samplerate and args.samplerate != sample_rate:
+		waveform = resample.resample(waveform, sample_rate, args.samplerate)
+		sample_rate = args.samplerate
+
+	if args.output:
+		wavio.write(args.output, waveform, sample_rate)
+		return
+
 	import sounddevice as sd
 	sd.play(waveform, sample_rate)
 	sd.wait()
@@ -1,65 +1,356 @@
 import argparse
+import glob
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from functools import lru_cache
 import numpy as np
-import wave
+from scipy.signal import lfilter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from audiolib import realtime, resample, wavio
 
 # get wav, return sample rate and file
 def load_wave(filename):
-    with wave.open(filename, 'r') as wav_file:
-        sample_rate = wav_file.getframerate()
-        n_channels = wav_file.getnchannels()
-        n_frames = wav_file.getnframes()
-        wave_data = np.frombuffer(wav_file.readframes(n_frames), dtype=np.int16)
-        wave_data = wave_data.reshape(-1, n_channels).astype(np.float32) / 32768  # Normalize to -1 to 1
-        return sample_rate, wave_data
+    with wavio.WavReader(filename) as wav_file:
+        return wav_file.sample_rate, wav_file.read()  # float32, normalized to -1 to 1
 
 # save wav
 def save_wave(filename, data, sample_rate):
-    n_channels = data.shape[1] if len(data.shape) > 1 else 1
-    with wave.open(filename, 'w') as wav_file:
-        wav_file.setnchannels(n_channels)
-        wav_file.setsampwidth(2)
-        wav_file.setframerate(sample_rate)
-        wav_data = (data * 32767).astype(np.int16)
-        wav_file.writeframes(wav_data.tobytes())
+    wavio.write(filename, data, sample_rate)  # 16-bit
+
+# sine LFO generated by a phasor recurrence
+    # each chunk is the phasor the last chunk ended on, rotated by a
+    # table of per-sample rotations computed once, so no trig runs over
+    # the whole duration and the phase carries over between calls
+class WahLFO:
+    def __init__(self, sample_rate, wah_freq, chunk_size=8192, phase=0.0):
+        step = 2 * np.pi * wah_freq / sample_rate  # radians per sample
+        k = np.arange(chunk_size)
+        self.cos_table = np.cos(step * k)
+        self.sin_table = np.sin(step * k)
+        self.chunk_size = chunk_size
+        self.step = complex(np.cos(step), np.sin(step))
+        self.phasor = complex(np.cos(phase), np.sin(phase))
+
+    # next n LFO values, sin(phase), written into out if given
+    def sin(self, n, out=None):
+        if out is None:
+            out = np.empty(n)
+        for start in range(0, n, self.chunk_size):
+            m = min(self.chunk_size, n - start)
+            z = self.phasor
+            # Im(z * e^{j step k}) for k = 0 .. m-1
+            chunk = out[start:start + m]
+            np.multiply(self.cos_table[:m], z.imag, out=chunk)
+            chunk += z.real * self.sin_table[:m]
+            # advance m samples and renormalize so rounding never builds up
+            z *= complex(self.cos_table[m - 1], self.sin_table[m - 1]) * self.step
+            self.phasor = z / abs(z)
+        return out
+
+    # next n values of the wah gain curve: dry * (1 - wet_dry) + dry * wah * wet_dry
+    # folds to (1 - wet_dry / 2) + (wet_dry / 2) * sin
+    def gain(self, n, wet_dry, out=None):
+        out = self.sin(n, out)
+        out *= wet_dry / 2
+        out += 1 - wet_dry / 2
+        return out
 
 # apply wah
-    # wave_data: waveform data as numpy array
+    # wave_data: waveform data as numpy array, (frames,) or (frames, channels)
     # sample_rate: sample rate of the waveform
     # wah_freq: frequency of the wah effect in hz
     # wet_dry: mix of the effect: 0 = dry, 1 = wet
-def apply_wah_effect(wave_data, sample_rate, wah_freq, wet_dry):
-    duration = len(wave_data) / sample_rate
-    t = np.linspace(0, duration, len(wave_data), endpoint=False)
-    wah = 0.5 + 0.5 * np.sin(2 * np.pi * wah_freq * t)  # Amplitude modulation
-
-    if wave_data.ndim == 1:  # Mono
-        wah_effect = wave_data * wah
-        return (1 - wet_dry) * wave_data + wet_dry * wah_effect
-    elif wave_data.ndim == 2:  # Stereo
-        wah_effect = np.zeros_like(wave_data)
-        for channel in range(wave_data.shape[1]):
-            wah_effect[:, channel] = wave_data[:, channel] * wah
-        return (1 - wet_dry) * wave_data + wet_dry * wah_effect
-    else:
+    # out: array to write the result to (may be wave_data itself)
+    # mode: "am" sweeps the volume, "filter" sweeps a resonant band-pass
+def apply_wah_effect(wave_data, sample_rate, wah_freq, wet_dry, out=None, mode="am", chunk_size=8192, **filter_args):
+    if wave_data.ndim not in (1, 2):
         raise ValueError("Too many (or too few!) channels in wav data")
+    if out is None:
+        out = np.empty(wave_data.shape, dtype=np.result_type(wave_data, np.float32))
+
+    if mode == "filter":
+        if out is not wave_data:
+            out[...] = wave_data
+        WahFilter(sample_rate, wah_freq, wet_dry, **filter_args).process(out)
+        return out
+    if mode != "am":
+        raise ValueError(f"Bad wah mode: {mode}")
+
+    # (frames, channels) views, so any channel count broadcasts the same way
+    frames_in = wave_data.reshape(len(wave_data), -1)
+    frames_out = out.reshape(len(out), -1)
+    lfo = WahLFO(sample_rate, wah_freq, chunk_size)
+    gain = np.empty(chunk_size)
+    for start in range(0, len(frames_in), chunk_size):
+        stop = min(start + chunk_size, len(frames_in))
+        g = lfo.gain(stop - start, wet_dry, gain[:stop - start])
+        np.multiply(frames_in[start:stop], g[:, None], out=frames_out[start:stop], casting="same_kind")
+    return out
+
+# wah effect for audio arriving in blocks (live or streamed)
+    # the LFO phase carries over from one block to the next, so the
+    # sweep is continuous across block boundaries
+class WahProcessor:
+    def __init__(self, sample_rate, wah_freq, wet_dry):
+        self.lfo = WahLFO(sample_rate, wah_freq)
+        self.wet_dry = wet_dry
+
+    # block: (frames, channels) float32, processed in place
+    def process(self, block):
+        gain = self.lfo.gain(len(block), self.wet_dry)
+        block *= gain.astype(np.float32)[:, None]
+        return block
+
+# "real" wah: a resonant band-pass whose center frequency the LFO sweeps
+    # between low and high Hz (on a log scale), mixed with the dry signal
+    # the biquad coefficients are recomputed every update_size samples
+    # and the filter state carries across updates and across calls,
+    # so blocks of any size give the same result
+class WahFilter:
+    def __init__(self, sample_rate, wah_freq, wet_dry, low=400.0, high=2000.0, q=4.0, update_size=64):
+        self.sample_rate = sample_rate
+        self.wet_dry = wet_dry
+        self.low = low
+        self.ratio = high / low
+        self.q = q
+        self.update_size = update_size
+        # the LFO only needs one value per coefficient update
+        self.lfo = WahLFO(sample_rate / update_size, wah_freq, chunk_size=256)
+        self.position = 0  # samples processed so far
+        self.coeffs = None
+        self.state = None
+
+    # RBJ cookbook band-pass (0 dB peak) at the LFO's next position
+    def next_coeffs(self):
+        sweep = 0.5 + 0.5 * self.lfo.sin(1)[0]
+        fc = self.low * self.ratio ** sweep
+        w0 = 2 * np.pi * fc / self.sample_rate
+        alpha = np.sin(w0) / (2 * self.q)
+        a0 = 1 + alpha
+        b = np.array([alpha, 0, -alpha]) / a0
+        a = np.array([1, -2 * np.cos(w0) / a0, (1 - alpha) / a0])
+        return b, a
+
+    # block: (frames,) or (frames, channels), processed in place
+    def process(self, block):
+        frames = block.reshape(len(block), -1)
+        if self.state is None or self.state.shape[1] != frames.shape[1]:
+            self.state = np.zeros((2, frames.shape[1]))
+        start = 0
+        while start < len(frames):
+            offset = self.position % self.update_size
+            if offset == 0 or self.coeffs is None:
+                self.coeffs = self.next_coeffs()
+            stop = min(len(frames), start + self.update_size - offset)
+            segment = frames[start:stop]
+            wet, self.state = lfilter(*self.coeffs, segment, axis=0, zi=self.state)
+            segment *= 1 - self.wet_dry
+            segment += self.wet_dry * wet
+            self.position += stop - start
+            start = stop
+        return block
+
+# the block processor for a wah mode, for the realtime engine and the effects stacker
+def make_wah(sample_rate, wah_freq, wet_dry, mode="am", **filter_args):
+    if mode == "filter":
+        return WahFilter(sample_rate, wah_freq, wet_dry, **filter_args)
+    if mode == "am":
+        return WahProcessor(sample_rate, wah_freq, wet_dry)
+    raise ValueError(f"Bad wah mode: {mode}")
+
+# one exact loop of the wah gain curve (dry/wet mix folded in),
+    # computed once per sample rate, wah frequency and mix and then
+    # tiled to each file's length
+    # returns None when no whole number of LFO cycles lands on a whole
+    # number of samples within max_samples
+@lru_cache(maxsize=16)
+def lfo_table(sample_rate, wah_freq, wet_dry, max_samples=1 << 22):
+    if wah_freq <= 0:
+        return None
+    period = Fraction(sample_rate) / Fraction(wah_freq)  # samples per LFO cycle
+    length = period.numerator  # samples in period.denominator whole cycles
+    if length > max_samples:
+        return None
+    t = np.arange(length) / sample_rate
+    gain = (1 - wet_dry) + wet_dry * (0.5 + 0.5 * np.sin(2 * np.pi * wah_freq * t))
+    gain = gain.astype(np.float32)
+    gain.flags.writeable = False
+    return gain
+
+# wah one file into another, using the cached LFO table when there is one
+    # output_rate, if given, resamples the result on the way out
+    # returns the length of the file in seconds
+def wah_file(input_file, output_file, wah_freq, wet_dry, mode="am", output_rate=None, **filter_args):
+    sample_rate, wave_data = load_wave(input_file)
+    seconds = len(wave_data) / sample_rate
+    table = lfo_table(sample_rate, wah_freq, wet_dry) if mode == "am" else None
+    if table is None:
+        apply_wah_effect(wave_data, sample_rate, wah_freq, wet_dry, out=wave_data, mode=mode, **filter_args)
+    else:
+        wave_data *= np.resize(table, len(wave_data))[:, None]
+    if output_rate and output_rate != sample_rate:
+        wave_data = resample.resample(wave_data, sample_rate, output_rate)
+        sample_rate = output_rate
+    save_wave(output_file, wave_data, sample_rate)
+    return seconds
+
+# digest of a file's contents plus the effect settings, for --skip hash
+def content_hash(filename, *params):
+    digest = hashlib.sha256(repr(params).encode())
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# digest of the effect settings alone, for --skip mtime
+def settings_hash(*params):
+    return hashlib.sha256(repr(params).encode()).hexdigest()
+
+# the sidecar file next to an output that records how it was
+# made, and the digest it should hold for this input and
+# these settings under a --skip mode
+def sidecar_path(output_file, skip):
+    return output_file + ('.sha256' if skip == 'hash' else '.settings')
+
+def sidecar_digest(input_file, skip, params):
+    if skip == 'hash':
+        return content_hash(input_file, *params)
+    return settings_hash(*params)
+
+# is output_file already the result of this input and these settings?
+    # mtime: output is newer than input, and a sidecar file
+    # records the same settings
+    # hash: a sidecar file records the input content hash and settings
+def up_to_date(input_file, output_file, skip, params):
+    if skip == 'none' or not os.path.exists(output_file):
+        return False
+    if skip == 'mtime' and os.path.getmtime(output_file) < os.path.getmtime(input_file):
+        return False
+    sidecar = sidecar_path(output_file, skip)
+    if not os.path.exists(sidecar):
+        return False
+    with open(sidecar) as f:
+        return f.read().strip() == sidecar_digest(input_file, skip, params)
+
+# one batch job, run in a worker process
+    # returns (input file, seconds of audio processed or None if skipped)
+def batch_job(input_file, output_file, wah_freq, wet_dry, skip, mode="am", filter_args=None, output_rate=None):
+    filter_args = filter_args or {}
+    params = (wah_freq, wet_dry, mode, sorted(filter_args.items()))
+    if output_rate:
+        params += (output_rate,)
+    if up_to_date(input_file, output_file, skip, params):
+        return input_file, None
+    seconds = wah_file(input_file, output_file, wah_freq, wet_dry, mode, output_rate, **filter_args)
+    # the output just changed, so only this mode's sidecar is
+    # still true of it
+    for kind in ('mtime', 'hash'):
+        sidecar = sidecar_path(output_file, kind)
+        if kind == skip:
+            with open(sidecar, 'w') as f:
+                f.write(sidecar_digest(input_file, skip, params) + '\n')
+        elif os.path.exists(sidecar):
+            os.remove(sidecar)
+    return input_file, seconds
+
+# wav files named by a directory or a glob pattern
+def batch_inputs(pattern):
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.wav')
+    return sorted(glob.glob(pattern))
+
+# wah every file matched by pattern into output_dir on a process pool
+def run_batch(pattern, output_dir, wah_freq, wet_dry, workers=None, skip='mtime', mode="am", filter_args=None, output_rate=None):
+    filter_args = filter_args or {}
+    inputs = batch_inputs(pattern)
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    done = skipped = 0
+    audio_seconds = 0.0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [
+            pool.submit(batch_job, name, os.path.join(output_dir, os.path.basename(name)),
+                        wah_freq, wet_dry, skip, mode, filter_args, output_rate)
+            for name in inputs
+        ]
+        for job in jobs:
+            name, seconds = job.result()
+            if seconds is None:
+                skipped += 1
+            else:
+                done += 1
+                audio_seconds += seconds
+    elapsed = time.perf_counter() - start
+    print(f"{done} files processed, {skipped} up to date, in {elapsed:.2f} s: "
+          f"{done / elapsed:.1f} files/s, {audio_seconds / elapsed:.1f} audio-seconds/s")
 
 def main():
     parser = argparse.ArgumentParser(description="Apply a wah effect to a WAV file.")
-    parser.add_argument("-i", "--input", required=True, help="Input WAV file")
-    parser.add_argument("-o", "--output", required=True,  help="Output WAV file")
+    parser.add_argument("-i", "--input", help="Input WAV file")
+    parser.add_argument("-o", "--output", help="Output WAV file")
+    parser.add_argument("--samplerate", type=int, help="Resample the output file(s) to this rate (default: the input's)")
     parser.add_argument("-f", "--freqency", type=float, default=1.0, help="Wah effect frequency (Hz)")
     parser.add_argument("-w", "--wet-dry", type=float, default=0.5, help="Wet/dry mix (0.0 = dry, 1.0 = wet)")
+    parser.add_argument("-m", "--mode", choices=["am", "filter"], default="am", help="am: volume sweep, filter: resonant band-pass sweep (real wah)")
+    parser.add_argument("--low", type=float, default=400.0, help="Lowest band-pass center frequency for --mode filter (Hz)")
+    parser.add_argument("--high", type=float, default=2000.0, help="Highest band-pass center frequency for --mode filter (Hz)")
+    parser.add_argument("-q", "--q", type=float, default=4.0, help="Band-pass resonance for --mode filter")
+
+    parser.add_argument("--live", action="store_true", help="Apply the wah live, from the default input device to the output device")
+    parser.add_argument("--simulate", action="store_true", help="Run the live block engine from -i to -o at device block size and report timing")
+    parser.add_argument("--paced", action="store_true", help="With --simulate, wait for each block's real-time deadline")
+    parser.add_argument("-b", "--block-size", type=int, default=256, help="Block size in frames for --live and --simulate")
+    parser.add_argument("-r", "--live-sample-rate", type=int, default=48000, help="Device sample rate for --live (see --samplerate for output files)")
+    parser.add_argument("-c", "--channels", type=int, default=1, help="Channel count for --live")
+
+    parser.add_argument("--batch", metavar="DIR_OR_GLOB", help="Wah every WAV in a directory (or matching a glob) into --output-dir")
+    parser.add_argument("--output-dir", help="Output directory for --batch")
+    parser.add_argument("-j", "--workers", type=int, help="Worker processes for --batch (default: one per CPU)")
+    parser.add_argument("--skip", choices=["mtime", "hash", "none"], default="mtime", help="How --batch decides an output is already up to date: mtime (newer than its input, same settings), hash (same input contents and settings) or none")
 
     args = parser.parse_args()
+    filter_args = {"low": args.low, "high": args.high, "q": args.q} if args.mode == "filter" else {}
+
+    if args.batch:
+        if not args.output_dir:
+            parser.error("--batch needs --output-dir")
+        run_batch(args.batch, args.output_dir, args.freqency, args.wet_dry, args.workers, args.skip, args.mode, filter_args, args.samplerate)
+        return
+
+    if args.live:
+        processor = make_wah(args.live_sample_rate, args.freqency, args.wet_dry, args.mode, **filter_args)
+        engine = realtime.BlockEngine([processor], args.live_sample_rate, args.block_size, args.channels)
+        print(realtime.run_live(engine))
+        return
+
+    if not args.input or not args.output:
+        parser.error("-i/--input and -o/--output are required unless --live is given")
+
+    if args.simulate:
+        with wavio.WavReader(args.input) as wav_file:
+            sample_rate = wav_file.sample_rate
+            n_channels = wav_file.channels
+        processor = make_wah(sample_rate, args.freqency, args.wet_dry, args.mode, **filter_args)
+        engine = realtime.BlockEngine([processor], sample_rate, args.block_size, n_channels)
+        print(realtime.run_simulated(engine, args.input, args.output, paced=args.paced))
+        return
 
     # Load input WAV
     sample_rate, wave_data = load_wave(args.input)
 
-    # Apply the wah effect
-    wah_wave = apply_wah_effect(wave_data, sample_rate, args.freqency, args.wet_dry)
+    # Apply the wah effect, in place
+    apply_wah_effect(wave_data, sample_rate, args.freqency, args.wet_dry, out=wave_data, mode=args.mode, **filter_args)
 
-    # Save the output WAV
-    save_wave(args.output, wah_wave, sample_rate)
+    # Save the output WAV, at the requested rate
+    if args.samplerate and args.samplerate != sample_rate:
+        wave_data = resample.resample(wave_data, sample_rate, args.samplerate)
+        sample_rate = args.samplerate
+    save_wave(args.output, wave_data, sample_rate)
 
 if __name__ == "__main__":
     main()